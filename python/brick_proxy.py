@@ -0,0 +1,512 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 agent <agent@local>
+#
+# Redistribution and use in source and binary forms of this file,
+# with or without modification, are permitted. See the Creative
+# Commons Zero (CC0 1.0) License for more details.
+
+from threading import Thread, Lock
+
+# Queue for python 2, queue for python 3
+try:
+    from Queue import Queue, Full
+except ImportError:
+    from queue import Queue, Full
+
+import struct
+import socket
+import sys
+import time
+import os
+import hmac
+import hashlib
+
+try:
+    from .ip_connection import IPConnection, Device, Error, BrickDaemon, namedtuple, \
+                               get_uid_from_data, get_length_from_data, \
+                               get_function_id_from_data, get_sequence_number_from_data, \
+                               get_enumerate_uid_from_data, get_enumeration_type_from_data
+except (ValueError, ImportError):
+    from ip_connection import IPConnection, Device, Error, BrickDaemon, namedtuple, \
+                              get_uid_from_data, get_length_from_data, \
+                              get_function_id_from_data, get_sequence_number_from_data, \
+                              get_enumerate_uid_from_data, get_enumeration_type_from_data
+
+try:
+    from . import get_device_class
+except (ValueError, ImportError):
+    get_device_class = None
+
+# hmac.compare_digest for python 2.7.7 and newer, fall back to == before
+try:
+    compare_digest = hmac.compare_digest
+except AttributeError:
+    def compare_digest(a, b):
+        return a == b
+
+ProxyStatistics = namedtuple('ProxyStatistics', ['clients', 'requests', 'forwarded', 'deduplicated', 'callbacks'])
+
+BRICK_DAEMON_UID = 1 # base58 '2'
+FUNCTION_GET_IDENTITY = 255
+ERROR_CODE_FUNCTION_NOT_SUPPORTED = 2
+MAX_CLIENT_SEND_QUEUE_SIZE = 1024 # packets, a client that falls further behind is dropped
+
+def get_response_expected_from_data(data):
+    return (struct.unpack('<B', data[6:7])[0] >> 3) & 0x01
+
+def set_sequence_number_in_data(data, sequence_number):
+    options = struct.unpack('<B', data[6:7])[0] & 0x0F
+
+    return data[0:6] + struct.pack('<B', (sequence_number << 4) | options) + data[7:]
+
+class UpstreamConnection(IPConnection):
+    def __init__(self, proxy):
+        IPConnection.__init__(self)
+
+        self.proxy = proxy
+
+    def handle_response(self, packet):
+        self.disconnect_probe_flag = False
+
+        # responses to the own requests of the proxy, e.g. authentication,
+        # are handled as usual
+        if not self.proxy.handle_upstream_packet(packet):
+            IPConnection.handle_response(self, packet)
+
+class BrickProxy:
+    class Client:
+        def __init__(self, socket, address, authenticated):
+            self.socket = socket
+            self.address = address
+            self.authenticated = authenticated
+            self.server_nonce = None
+            self.send_queue = Queue(MAX_CLIENT_SEND_QUEUE_SIZE)
+            self.send_thread = Thread(name='Proxy-Client-Sender', target=self.send_loop)
+            self.send_thread.daemon = True
+            self.send_thread.start()
+
+        def send(self, packet):
+            # never blocks, a stalled client must not stall the upstream
+            # receive thread and with it all other clients
+            try:
+                self.send_queue.put_nowait(packet)
+            except Full:
+                self.close()
+
+        def close(self):
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+            try:
+                self.socket.close()
+            except socket.error:
+                pass
+
+        def stop(self):
+            try:
+                self.send_queue.put_nowait(None)
+            except Full:
+                pass # the sender is stuck in sendall, closing the socket ends it
+
+        def send_loop(self):
+            while True:
+                packet = self.send_queue.get()
+
+                if packet is None:
+                    return
+
+                try:
+                    self.socket.sendall(packet)
+                except socket.error:
+                    self.close() # client_loop removes the client
+                    return
+
+    class PendingRequest:
+        def __init__(self, key):
+            self.key = key # (uid, function_id, payload) or None if not deduplicated
+            self.timestamp = time.time()
+            self.waiters = [] # (client, sequence_number)
+
+    def __init__(self, host, port, secret=None, local_secret=None):
+        """
+        Creates a proxy that shares one connection to the Brick Daemon or
+        WIFI/Ethernet Extension at *host* and *port* between many local
+        clients. The proxy authenticates with *secret* if given.
+
+        If *local_secret* is given, clients have to authenticate with it
+        before their requests are forwarded, like with brickd. Otherwise only
+        clients from the loopback interface are accepted, because they share
+        the authenticated upstream connection.
+
+        Identical getter requests that are in flight at the same time are only
+        sent once, callbacks are sent to every client.
+        """
+
+        self.host = host
+        self.port = port
+        self.secret = secret
+        self.local_secret = local_secret
+        self.upstream = UpstreamConnection(self)
+        self.server_socket = None
+        self.server_thread = None
+        self.clients = [] # protected by lock
+        self.pending = {} # (uid, function_id, sequence_number) -> PendingRequest, protected by lock
+        self.in_flight = {} # (uid, function_id, payload) -> (uid, function_id, sequence_number), protected by lock
+        self.getters = {} # uid -> set of getter function IDs, protected by lock
+        self.getters_by_device_identifier = {} # protected by lock
+        self.requests = 0 # protected by lock
+        self.forwarded = 0 # protected by lock
+        self.deduplicated = 0 # protected by lock
+        self.callbacks = 0 # protected by lock
+        self.lock = Lock()
+
+    def listen(self, address='127.0.0.1', port=4224):
+        """
+        Connects to the upstream endpoint and starts to accept local clients
+        on *address* and *port*. Returns immediately.
+        """
+
+        self.upstream.connect(self.host, self.port)
+
+        try:
+            if self.secret is not None:
+                self.upstream.authenticate(self.secret)
+
+            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.server_socket.bind((address, port))
+            self.server_socket.listen(10)
+        except:
+            self.upstream.disconnect()
+
+            if self.server_socket is not None:
+                self.server_socket.close()
+                self.server_socket = None
+
+            raise
+
+        self.server_thread = Thread(name='Proxy-Acceptor', target=self.accept_loop,
+                                    args=(self.server_socket,))
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+        # learn the device identifiers to know which functions are getters
+        self.upstream.enumerate()
+
+    def close(self):
+        """
+        Disconnects all local clients and the upstream connection.
+        """
+
+        if self.server_socket is not None:
+            self.server_socket.close()
+            self.server_socket = None
+
+        with self.lock:
+            clients = self.clients
+            self.clients = []
+
+        for client in clients:
+            client.stop()
+            client.close()
+
+        self.upstream.disconnect()
+
+    def get_listen_port(self):
+        """
+        Returns the port number that local clients connect to.
+        """
+
+        return self.server_socket.getsockname()[1]
+
+    def get_statistics(self):
+        """
+        Returns the number of connected clients, the number of requests
+        received from clients, the number of requests forwarded upstream, the
+        number of requests that were answered by an identical request already
+        in flight and the number of callbacks received from upstream.
+        """
+
+        with self.lock:
+            return ProxyStatistics(len(self.clients), self.requests, self.forwarded,
+                                   self.deduplicated, self.callbacks)
+
+    def accept_loop(self, server_socket):
+        while True:
+            try:
+                client_socket, client_address = server_socket.accept()
+            except socket.error:
+                return
+
+            if self.local_secret is None and not client_address[0].startswith('127.'):
+                # without a local secret remote clients would get the
+                # authenticated upstream connection for free
+                client_socket.close()
+                continue
+
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = BrickProxy.Client(client_socket, client_address, self.local_secret is None)
+
+            with self.lock:
+                self.clients.append(client)
+
+            thread = Thread(name='Proxy-Client', target=self.client_loop, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    def client_loop(self, client):
+        if sys.hexversion < 0x03000000:
+            pending_data = ''
+        else:
+            pending_data = bytes()
+
+        while True:
+            try:
+                data = client.socket.recv(8192)
+            except socket.error:
+                data = ''
+
+            if len(data) == 0:
+                break
+
+            pending_data += data
+
+            while len(pending_data) >= 8:
+                length = get_length_from_data(pending_data)
+
+                if length < 8:
+                    # not a TPF stream, drop the client
+                    pending_data = pending_data[0:0]
+                    client.close()
+                    break
+
+                if len(pending_data) < length:
+                    # Wait for complete packet
+                    break
+
+                packet = pending_data[0:length]
+                pending_data = pending_data[length:]
+
+                self.handle_client_packet(client, packet)
+
+        self.remove_client(client)
+
+    def remove_client(self, client):
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+            for pending_request in self.pending.values():
+                pending_request.waiters = [waiter for waiter in pending_request.waiters
+                                           if waiter[0] is not client]
+
+        client.stop()
+        client.close()
+
+    def get_getters(self, device_identifier):
+        # NOTE: assumes that lock is locked
+        getters = self.getters_by_device_identifier.get(device_identifier)
+
+        if getters is None:
+            getters = set([FUNCTION_GET_IDENTITY])
+
+            if get_device_class is not None:
+                try:
+                    device_class = get_device_class(device_identifier)
+                except ValueError:
+                    device_class = None
+
+                if device_class is not None:
+                    response_expected = device_class('1', IPConnection()).response_expected
+
+                    for function_id in range(len(response_expected)):
+                        if response_expected[function_id] == Device.RESPONSE_EXPECTED_ALWAYS_TRUE:
+                            getters.add(function_id)
+
+            self.getters_by_device_identifier[device_identifier] = getters
+
+        return getters
+
+    def handle_client_packet(self, client, packet):
+        uid = get_uid_from_data(packet)
+        function_id = get_function_id_from_data(packet)
+        sequence_number = get_sequence_number_from_data(packet)
+        response_expected = get_response_expected_from_data(packet)
+
+        if function_id == IPConnection.FUNCTION_DISCONNECT_PROBE:
+            return # the upstream connection has its own disconnect probe
+
+        if uid == BRICK_DAEMON_UID:
+            self.handle_brick_daemon_packet(client, packet, function_id, response_expected)
+            return
+
+        if not client.authenticated:
+            return # brickd drops requests of unauthenticated clients too
+
+        key = None
+
+        with self.lock:
+            self.requests += 1
+            now = time.time()
+
+            if response_expected:
+                if function_id in self.getters.get(uid, ()):
+                    key = (uid, function_id, packet[8:])
+                    upstream_key = self.in_flight.get(key)
+
+                    if upstream_key is not None:
+                        pending_request = self.pending.get(upstream_key)
+
+                        if pending_request is not None and \
+                           pending_request.key == key and \
+                           now - pending_request.timestamp < self.upstream.timeout:
+                            pending_request.waiters.append((client, sequence_number))
+                            self.deduplicated += 1
+                            return
+
+                # pick an upstream sequence number that is not in flight for
+                # this function, unanswered requests are given up after the
+                # timeout
+                for i in range(15):
+                    upstream_sequence_number = self.upstream.get_next_sequence_number()
+                    upstream_key = (uid, function_id, upstream_sequence_number)
+                    pending_request = self.pending.get(upstream_key)
+
+                    if pending_request is None or \
+                       now - pending_request.timestamp >= self.upstream.timeout:
+                        break
+
+                if pending_request is not None and pending_request.key is not None:
+                    self.in_flight.pop(pending_request.key, None)
+
+                pending_request = BrickProxy.PendingRequest(key)
+                pending_request.waiters.append((client, sequence_number))
+                self.pending[upstream_key] = pending_request
+
+                if key is not None:
+                    self.in_flight[key] = upstream_key
+            else:
+                upstream_sequence_number = self.upstream.get_next_sequence_number()
+
+            self.forwarded += 1
+
+        try:
+            self.upstream.send(set_sequence_number_in_data(packet, upstream_sequence_number))
+        except Error:
+            # the client will run into a timeout, as with a direct connection
+            pass
+
+    def handle_brick_daemon_packet(self, client, packet, function_id, response_expected):
+        # local clients share the authenticated upstream connection, they
+        # authenticate with the local secret, if any
+        if function_id == BrickDaemon.FUNCTION_GET_AUTHENTICATION_NONCE:
+            payload = os.urandom(4)
+            error_code = 0
+            client.server_nonce = payload
+        elif function_id == BrickDaemon.FUNCTION_AUTHENTICATE:
+            if self.local_secret is not None:
+                if client.server_nonce is None or len(packet) < 32:
+                    authenticated = False
+                else:
+                    h = hmac.new(self.local_secret.encode('ascii'), digestmod=hashlib.sha1)
+
+                    h.update(client.server_nonce)
+                    h.update(packet[8:12])
+
+                    authenticated = compare_digest(h.digest(), packet[12:32])
+
+                # a nonce is only good for one attempt
+                client.server_nonce = None
+
+                if not authenticated:
+                    # brickd closes the connection on a failed authentication
+                    client.close()
+                    return
+
+                client.authenticated = True
+
+            if not response_expected:
+                return
+
+            payload = packet[0:0]
+            error_code = 0
+        else:
+            payload = packet[0:0]
+            error_code = ERROR_CODE_FUNCTION_NOT_SUPPORTED
+
+        client.send(packet[0:4] + struct.pack('<BBBB', 8 + len(payload),
+                                              function_id,
+                                              struct.unpack('<B', packet[6:7])[0],
+                                              error_code << 6) + payload)
+
+    def handle_upstream_packet(self, packet):
+        uid = get_uid_from_data(packet)
+        function_id = get_function_id_from_data(packet)
+        sequence_number = get_sequence_number_from_data(packet)
+
+        if sequence_number == 0:
+            if function_id == IPConnection.CALLBACK_ENUMERATE:
+                self.handle_enumerate(packet)
+
+            with self.lock:
+                self.callbacks += 1
+                clients = list(self.clients)
+
+            for client in clients:
+                if client.authenticated:
+                    client.send(packet)
+
+            # the proxy has no callbacks of its own
+            return True
+
+        with self.lock:
+            pending_request = self.pending.pop((uid, function_id, sequence_number), None)
+
+            if pending_request is None:
+                return False
+
+            if pending_request.key is not None:
+                self.in_flight.pop(pending_request.key, None)
+
+        for client, client_sequence_number in pending_request.waiters:
+            client.send(set_sequence_number_in_data(packet, client_sequence_number))
+
+        return True
+
+    def handle_enumerate(self, packet):
+        uid = get_enumerate_uid_from_data(packet)
+
+        with self.lock:
+            if get_enumeration_type_from_data(packet) == IPConnection.ENUMERATION_TYPE_DISCONNECTED:
+                self.getters.pop(uid, None)
+            else:
+                device_identifier = struct.unpack('<H', packet[31:33])[0]
+                self.getters[uid] = self.get_getters(device_identifier)
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Shares one connection to a Brick Daemon or WIFI/Ethernet Extension between many local clients')
+    parser.add_argument('--host', default='localhost', help='upstream host, default: localhost')
+    parser.add_argument('--port', default=4223, type=int, help='upstream port, default: 4223')
+    parser.add_argument('--secret', default=None, help='secret for upstream authentication')
+    parser.add_argument('--local-secret', default=None, help='secret that local clients have to authenticate with, required for non-loopback clients')
+    parser.add_argument('--listen-address', default='127.0.0.1', help='address to accept local clients on, default: 127.0.0.1')
+    parser.add_argument('--listen-port', default=4224, type=int, help='port to accept local clients on, default: 4224')
+
+    args = parser.parse_args()
+    proxy = BrickProxy(args.host, args.port, args.secret, args.local_secret)
+    proxy.listen(args.listen_address, args.listen_port)
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+    proxy.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 agent <agent@local>
+#
+# Redistribution and use in source and binary forms of this file,
+# with or without modification, are permitted. See the Creative
+# Commons Zero (CC0 1.0) License for more details.
+
+from threading import Lock
+from collections import deque
+
+import time
+import math
+
+try:
+    from .ip_connection import namedtuple, numpy
+except (ValueError, ImportError):
+    from ip_connection import namedtuple, numpy
+
+WindowStatistics = namedtuple('WindowStatistics', ['min', 'max', 'mean', 'stddev', 'count'])
+
+class DeadbandStage:
+    def __init__(self, threshold, index):
+        self.threshold = threshold
+        self.index = index
+        self.last_value = None
+
+    def process(self, args):
+        value = args[self.index]
+
+        if self.last_value is not None and abs(value - self.last_value) < self.threshold:
+            return None
+
+        self.last_value = value
+
+        return args
+
+class RateLimitStage:
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_time = 0
+
+    def process(self, args):
+        now = time.time()
+
+        if now < self.next_time:
+            return None
+
+        self.next_time = now + self.interval
+
+        return args
+
+class DecimationStage:
+    def __init__(self, factor):
+        self.factor = factor
+        self.counter = 0
+
+    def process(self, args):
+        self.counter += 1
+
+        if self.counter < self.factor:
+            return None
+
+        self.counter = 0
+
+        return args
+
+class WindowStage:
+    def __init__(self, size, step, index):
+        self.size = size
+        self.step = step
+        self.index = index
+        self.values = deque(maxlen=size) # drops the oldest value when full
+        self.counter = 0
+
+    def process(self, args):
+        self.values.append(args[self.index])
+        self.counter += 1
+
+        if self.counter < self.step:
+            return None
+
+        self.counter = 0
+
+        return (self.get_statistics(),)
+
+    def get_statistics(self):
+        count = len(self.values)
+
+        if numpy is not None:
+            values = numpy.array(self.values, dtype=numpy.float64)
+
+            return WindowStatistics(values.min(), values.max(), values.mean(), values.std(), count)
+
+        mean = float(sum(self.values)) / count
+        variance = sum([(value - mean) ** 2 for value in self.values]) / count
+
+        return WindowStatistics(min(self.values), max(self.values), mean, math.sqrt(variance), count)
+
+class CallbackPipeline:
+    def __init__(self, listener):
+        """
+        Creates a pipeline of filter stages for callback values that calls
+        *listener* with the values that passed all stages. Stages are added
+        with the add_* functions and run in the order they were added.
+
+        The pipeline is attached to a callback as a listener. Without an
+        executor it runs on the callback thread right after the callback
+        payload was decoded.
+
+        The stages process one callback at a time, they are not vectorized
+        over batches of queued callbacks. Deadband and rate limiting depend
+        on the last value that passed, so they are sequential anyway, and
+        the callback thread decodes and dispatches each packet on its own.
+        NumPy is only used for the window statistics.
+        """
+
+        self.listener = listener
+        self.stages = []
+        self.lock = Lock()
+
+    def add_deadband(self, threshold, index=0):
+        """
+        Drops values that differ less than *threshold* from the last value
+        that passed this stage. *index* selects the callback parameter.
+        """
+
+        self.stages.append(DeadbandStage(threshold, index))
+
+        return self
+
+    def add_rate_limit(self, interval):
+        """
+        Drops values that arrive less than *interval* seconds after the last
+        value that passed this stage.
+        """
+
+        if interval < 0:
+            raise ValueError('Interval cannot be negative')
+
+        self.stages.append(RateLimitStage(interval))
+
+        return self
+
+    def add_decimation(self, factor):
+        """
+        Passes only every *factor*-th value.
+        """
+
+        if factor < 1:
+            raise ValueError('Factor has to be at least 1')
+
+        self.stages.append(DecimationStage(factor))
+
+        return self
+
+    def add_window(self, size, step=None, index=0):
+        """
+        Collects the last *size* values of the callback parameter selected by
+        *index* and passes a WindowStatistics tuple with min, max, mean,
+        standard deviation and count of the window every *step* values.
+        *step* defaults to *size*. The statistics are computed with NumPy if
+        it is available.
+        """
+
+        if step is None:
+            step = size
+
+        if size < 1 or step < 1:
+            raise ValueError('Size and step have to be at least 1')
+
+        self.stages.append(WindowStage(size, step, index))
+
+        return self
+
+    def attach(self, device, id, executor=None):
+        """
+        Adds the pipeline as listener to the callback with ID *id* of *device*,
+        which can also be an IP Connection. Returns the listener token.
+        """
+
+        return device.add_listener(id, self, executor)
+
+    def __call__(self, *args):
+        # the listener is called without holding the lock, so it can feed
+        # values back into the pipeline without deadlocking
+        with self.lock:
+            for stage in self.stages:
+                args = stage.process(args)
+
+                if args is None:
+                    return
+
+        self.listener(*args)
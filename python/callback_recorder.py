@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 agent <agent@local>
+#
+# Redistribution and use in source and binary forms of this file,
+# with or without modification, are permitted. See the Creative
+# Commons Zero (CC0 1.0) License for more details.
+
+from threading import Thread, Lock, Event
+
+import os
+import time
+import mmap
+import struct
+
+try:
+    from .ip_connection import numpy, base58encode, get_uid_from_data, get_function_id_from_data
+except (ValueError, ImportError):
+    from ip_connection import numpy, base58encode, get_uid_from_data, get_function_id_from_data
+
+# time.monotonic for python 3.3 and newer, fall back to time.time before
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    monotonic = time.time
+
+TIMESTAMP_COLUMN = 't'
+
+def get_stream_directory(directory, uid, function_id):
+    return os.path.join(directory, '{0}_{1}'.format(uid, function_id))
+
+def get_column_specs(form):
+    # (format, item count, offset in payload, size) for each callback parameter
+    specs = []
+    offset = 0
+
+    for f in form.split(' '):
+        size = struct.calcsize('<' + f)
+
+        if len(f) > 1 and f[-1] != 's':
+            count = int(f[:-1])
+        else:
+            count = 1
+
+        specs.append((f, count, offset, size))
+        offset += size
+
+    return specs
+
+def get_segment_numbers(stream_directory):
+    numbers = []
+
+    for filename in os.listdir(stream_directory):
+        name, extension = os.path.splitext(filename)
+
+        if extension == '.' + TIMESTAMP_COLUMN:
+            try:
+                numbers.append(int(name))
+            except ValueError:
+                pass
+
+    return sorted(numbers)
+
+def get_segment_filename(stream_directory, number, column):
+    return os.path.join(stream_directory, '{0:06d}.{1}'.format(number, column))
+
+class RecorderStream:
+    def __init__(self, stream_directory, form, max_segment_size, max_segment_count):
+        self.stream_directory = stream_directory
+        self.form = form
+        self.column_specs = get_column_specs(form)
+        self.row_size = 8 + sum([spec[3] for spec in self.column_specs])
+        self.max_segment_size = max_segment_size
+        self.max_segment_count = max_segment_count
+        self.segment_number = 0
+        self.segment_size = 0
+        self.files = None
+
+        if not os.path.exists(stream_directory):
+            os.makedirs(stream_directory)
+
+        f = open(os.path.join(stream_directory, 'format'), 'w')
+
+        try:
+            f.write(form)
+        finally:
+            f.close()
+
+        # never append to a segment of an earlier recording, it might have
+        # been cut off in the middle of a row
+        segment_numbers = get_segment_numbers(stream_directory)
+
+        if len(segment_numbers) > 0:
+            self.segment_number = segment_numbers[-1]
+
+    def open_segment(self):
+        self.close()
+
+        self.segment_number += 1
+        self.segment_size = 0
+        self.files = [open(get_segment_filename(self.stream_directory, self.segment_number, TIMESTAMP_COLUMN), 'ab')]
+
+        for i in range(len(self.column_specs)):
+            self.files.append(open(get_segment_filename(self.stream_directory, self.segment_number, i), 'ab'))
+
+        segment_numbers = get_segment_numbers(self.stream_directory)
+
+        for number in segment_numbers[:max(0, len(segment_numbers) - self.max_segment_count)]:
+            os.remove(get_segment_filename(self.stream_directory, number, TIMESTAMP_COLUMN))
+
+            for i in range(len(self.column_specs)):
+                try:
+                    os.remove(get_segment_filename(self.stream_directory, number, i))
+                except OSError:
+                    pass
+
+    def close(self):
+        if self.files is not None:
+            for f in self.files:
+                f.close()
+
+            self.files = None
+
+    def write(self, timestamps, payloads):
+        if self.files is None or self.segment_size >= self.max_segment_size:
+            self.open_segment()
+
+        count = len(timestamps)
+        data = payloads[0][0:0].join(payloads)
+
+        self.files[0].write(struct.pack('<{0}d'.format(count), *timestamps))
+
+        if numpy is not None:
+            # transpose the rows into columns in one go
+            dtype = numpy.dtype([('c{0}'.format(i), 'V{0}'.format(spec[3])) for i, spec in enumerate(self.column_specs)])
+            rows = numpy.frombuffer(data, dtype, count)
+
+            for i in range(len(self.column_specs)):
+                self.files[i + 1].write(rows['c{0}'.format(i)].tobytes())
+        else:
+            for i, (f, item_count, offset, size) in enumerate(self.column_specs):
+                self.files[i + 1].write(data[0:0].join([payload[offset:offset + size] for payload in payloads]))
+
+        for f in self.files:
+            f.flush()
+
+        self.segment_size += count * self.row_size
+
+class CallbackRecorder:
+    def __init__(self, ipcon, directory, max_segment_size=16*1024*1024, max_segment_count=16, flush_interval=0.1):
+        """
+        Creates a recorder that writes callbacks received by *ipcon* to
+        columnar files in *directory*. Each recorded callback of each device
+        gets its own subdirectory. The receive timestamp and each callback
+        parameter are stored in separate files per segment as little endian
+        arrays.
+
+        A new segment is started when the current one exceeds
+        *max_segment_size* bytes, the oldest segments are removed to keep
+        at most *max_segment_count* segments. Received callbacks are written
+        every *flush_interval* seconds.
+        """
+
+        self.ipcon = ipcon
+        self.directory = directory
+        self.max_segment_size = max_segment_size
+        self.max_segment_count = max_segment_count
+        self.flush_interval = flush_interval
+        self.streams = {} # (uid, function_id) -> RecorderStream, protected by lock
+        self.pending = {} # (uid, function_id) -> ([timestamp, ...], [payload, ...]), protected by lock
+        self.lock = Lock()
+        self.write_lock = Lock()
+        self.stop_event = Event()
+        self.clock_offset = time.time() - monotonic()
+        self.thread = Thread(name='Callback-Recorder', target=self.write_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+        ipcon.add_packet_tap(self.tap)
+
+    def record(self, device, id):
+        """
+        Starts to record the callback with ID *id* of *device*. The callback
+        doesn't have to be registered with the device.
+        """
+
+        key = (device.uid, id)
+        stream_directory = get_stream_directory(self.directory, base58encode(device.uid), id)
+        stream = RecorderStream(stream_directory, device.callback_formats[id],
+                                self.max_segment_size, self.max_segment_count)
+
+        with self.lock:
+            self.streams[key] = stream
+
+    def stop(self, device, id):
+        """
+        Stops to record the callback with ID *id* of *device*.
+        """
+
+        self.flush()
+
+        with self.lock:
+            stream = self.streams.pop((device.uid, id), None)
+
+        if stream is not None:
+            with self.write_lock:
+                stream.close()
+
+    def close(self):
+        """
+        Stops recording and writes all pending callbacks.
+        """
+
+        self.ipcon.remove_packet_tap(self.tap)
+        self.stop_event.set()
+        self.thread.join()
+        self.flush()
+
+        with self.lock:
+            streams = list(self.streams.values())
+            self.streams = {}
+
+        with self.write_lock:
+            for stream in streams:
+                stream.close()
+
+    def tap(self, packet):
+        key = (get_uid_from_data(packet), get_function_id_from_data(packet))
+        timestamp = self.clock_offset + monotonic()
+
+        with self.lock:
+            if key not in self.streams:
+                return
+
+            try:
+                timestamps, payloads = self.pending[key]
+            except KeyError:
+                timestamps, payloads = [], []
+                self.pending[key] = (timestamps, payloads)
+
+            timestamps.append(timestamp)
+            payloads.append(packet[8:])
+
+    def flush(self):
+        with self.write_lock:
+            with self.lock:
+                pending = self.pending
+                self.pending = {}
+                streams = dict(self.streams)
+
+            for key, (timestamps, payloads) in pending.items():
+                stream = streams.get(key)
+
+                if stream is not None:
+                    stream.write(timestamps, payloads)
+
+    def write_loop(self):
+        while not self.stop_event.is_set():
+            self.stop_event.wait(self.flush_interval)
+            self.flush()
+
+class CallbackRecordingReader:
+    def __init__(self, directory, uid, id):
+        """
+        Creates a reader for the recording of the callback with ID *id* of
+        the device with UID *uid* in *directory*.
+        """
+
+        self.stream_directory = get_stream_directory(directory, uid, id)
+
+        f = open(os.path.join(self.stream_directory, 'format'), 'r')
+
+        try:
+            self.form = f.read().strip()
+        finally:
+            f.close()
+
+        self.column_specs = get_column_specs(self.form)
+
+    def read(self, start=None, end=None):
+        """
+        Returns the receive timestamps and a list with the values of each
+        callback parameter for all callbacks received from *start* to *end*
+        (inclusive, seconds since the epoch). Without NumPy the values are
+        lists, otherwise NumPy arrays. Segments are memory mapped and
+        searched by timestamp, only the rows in the range are decoded.
+        """
+
+        timestamps = []
+        columns = [[] for spec in self.column_specs]
+
+        for number in get_segment_numbers(self.stream_directory):
+            segment_timestamps, segment_columns = self.read_segment(number, start, end)
+            timestamps.append(segment_timestamps)
+
+            for i in range(len(columns)):
+                columns[i].append(segment_columns[i])
+
+        if numpy is not None:
+            if len(timestamps) == 0:
+                return numpy.zeros(0), [numpy.zeros(0) for column in columns]
+
+            return numpy.concatenate(timestamps), [numpy.concatenate(column) for column in columns]
+
+        return sum(timestamps, []), [sum(column, []) for column in columns]
+
+    def map_file(self, filename):
+        f = open(filename, 'rb')
+
+        try:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+
+    def read_segment(self, number, start, end):
+        timestamp_map = self.map_file(get_segment_filename(self.stream_directory, number, TIMESTAMP_COLUMN))
+        column_maps = []
+
+        try:
+            for i in range(len(self.column_specs)):
+                column_maps.append(self.map_file(get_segment_filename(self.stream_directory, number, i)))
+
+            row_count = 0
+
+            if timestamp_map is not None:
+                # a row might be incomplete if the recorder was interrupted
+                row_count = len(timestamp_map) // 8
+
+                for column_map, spec in zip(column_maps, self.column_specs):
+                    if column_map is None:
+                        row_count = 0
+                    else:
+                        row_count = min(row_count, len(column_map) // spec[3])
+
+            first = 0
+            last = row_count
+
+            if start is not None:
+                first = self.find_row(timestamp_map, 0, row_count, start)
+
+            if end is not None:
+                last = self.find_row(timestamp_map, first, row_count, end, True)
+
+            timestamps = self.decode(timestamp_map, 'd', 1, 8, first, last)
+            columns = []
+
+            for column_map, (f, count, offset, size) in zip(column_maps, self.column_specs):
+                columns.append(self.decode(column_map, f, count, size, first, last))
+
+            return timestamps, columns
+        finally:
+            for m in [timestamp_map] + column_maps:
+                if m is not None:
+                    m.close()
+
+    def find_row(self, timestamp_map, low, high, timestamp, after_equal=False):
+        # binary search over the timestamp column, timestamps are monotonic
+        while low < high:
+            middle = (low + high) // 2
+            value = struct.unpack_from('<d', timestamp_map, middle * 8)[0]
+
+            if value < timestamp or (after_equal and value == timestamp):
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def decode(self, m, f, count, size, first, last):
+        rows = max(0, last - first)
+
+        if numpy is not None:
+            if f[-1] == 's':
+                dtype = numpy.dtype('S{0}'.format(size))
+            else:
+                dtype = numpy.dtype('<' + f[-1])
+
+            if rows == 0:
+                return numpy.zeros(0, dtype)
+
+            # copy, the memory map is closed after reading
+            values = numpy.frombuffer(m, dtype, rows * size // dtype.itemsize, first * size).copy()
+
+            if count > 1:
+                values = values.reshape(rows, count)
+
+            return values
+
+        if rows == 0:
+            return []
+
+        if f[-1] == 's':
+            return [m[i * size:(i + 1) * size] for i in range(first, last)]
+
+        values = struct.unpack_from('<{0}{1}'.format(rows * count, f[-1]), m, first * size)
+
+        if count > 1:
+            return [values[i:i + count] for i in range(0, len(values), count)]
+
+        return list(values)
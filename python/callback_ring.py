@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 agent <agent@local>
+#
+# Redistribution and use in source and binary forms of this file,
+# with or without modification, are permitted. See the Creative
+# Commons Zero (CC0 1.0) License for more details.
+
+from threading import Lock
+
+import time
+import struct
+
+# multiprocessing.shared_memory for python 3.8 and newer
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+try:
+    from .ip_connection import base58encode, get_uid_from_data, get_function_id_from_data
+except (ValueError, ImportError):
+    from ip_connection import base58encode, get_uid_from_data, get_function_id_from_data
+
+# time.monotonic for python 3.3 and newer, fall back to time.time before
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    monotonic = time.time
+
+# header: magic, version, capacity, record size, write count, callback format
+HEADER_FORMAT = '<4sB3xIIQ40s'
+HEADER_SIZE = 64
+WRITE_COUNT_OFFSET = 16
+MAGIC = b'TFCR'
+VERSION = 1
+
+# record: sequence number (write count + 1, 0 while written), timestamp, payload
+RECORD_HEADER_FORMAT = '<Qd'
+RECORD_HEADER_SIZE = 16
+
+# names of the blocks created by publishers of this process, protected by
+# created_names_lock. a consumer in the same process must not unregister them
+# from the resource tracker
+created_names = set()
+created_names_lock = Lock()
+
+def check_shared_memory():
+    if shared_memory is None:
+        raise RuntimeError('Callback rings require multiprocessing.shared_memory (Python 3.8 or newer)')
+
+class CallbackRing:
+    def __init__(self, memory, form, capacity, payload_size):
+        self.memory = memory
+        self.buffer = memory.buf
+        self.form = form
+        self.capacity = capacity
+        self.record_size = RECORD_HEADER_SIZE + payload_size
+        self.write_count = 0
+        self.closed = False # protected by lock
+        self.lock = Lock()
+
+    def write(self, timestamp, payload):
+        with self.lock:
+            if not self.closed:
+                self.write_unlocked(timestamp, payload)
+
+    def write_unlocked(self, timestamp, payload):
+        # single producer, readers detect overwritten records by the
+        # sequence number that is cleared while the record is written
+        offset = HEADER_SIZE + (self.write_count % self.capacity) * self.record_size
+        self.write_count += 1
+
+        struct.pack_into('<Q', self.buffer, offset, 0)
+        self.buffer[offset + RECORD_HEADER_SIZE:offset + self.record_size] = payload
+        struct.pack_into('<d', self.buffer, offset + 8, timestamp)
+        struct.pack_into('<Q', self.buffer, offset, self.write_count)
+        struct.pack_into('<Q', self.buffer, WRITE_COUNT_OFFSET, self.write_count)
+
+class CallbackRingPublisher:
+    def __init__(self, ipcon, capacity=4096):
+        """
+        Creates a publisher that writes the raw callback records received by
+        *ipcon* into ring buffers in shared memory, one per published
+        callback with room for *capacity* records each. Records are written
+        on the receive thread, before the callback is queued.
+
+        Requires Python 3.8 or newer.
+        """
+
+        check_shared_memory()
+
+        self.ipcon = ipcon
+        self.capacity = capacity
+        self.rings = {} # (uid, function_id) -> CallbackRing, replaced on change
+        self.lock = Lock()
+        self.clock_offset = time.time() - monotonic()
+
+        ipcon.add_packet_tap(self.tap)
+
+    def publish(self, device, id, name=None):
+        """
+        Starts to publish the callback with ID *id* of *device* and returns
+        the name of the shared memory block for CallbackRingConsumer. The
+        name defaults to tf_<uid>_<id>.
+        """
+
+        form = device.callback_formats[id]
+
+        if len(form) > 40:
+            raise ValueError('Callback format is too long for the ring header')
+
+        if name is None:
+            name = 'tf_{0}_{1}'.format(base58encode(device.uid), id)
+
+        payload_size = struct.calcsize('<' + form.replace(' ', ''))
+        record_size = RECORD_HEADER_SIZE + payload_size
+        memory = shared_memory.SharedMemory(name, True, HEADER_SIZE + self.capacity * record_size)
+
+        with created_names_lock:
+            created_names.add(memory.name)
+
+        struct.pack_into(HEADER_FORMAT, memory.buf, 0, MAGIC, VERSION, self.capacity,
+                         record_size, 0, form.encode('ascii'))
+
+        with self.lock:
+            rings = dict(self.rings)
+            old_ring = rings.get((device.uid, id))
+            rings[(device.uid, id)] = CallbackRing(memory, form, self.capacity, payload_size)
+            self.rings = rings
+
+        if old_ring is not None:
+            self.close_ring(old_ring)
+
+        return name
+
+    def unpublish(self, device, id):
+        """
+        Stops to publish the callback with ID *id* of *device* and removes its
+        shared memory block.
+        """
+
+        with self.lock:
+            rings = dict(self.rings)
+            ring = rings.pop((device.uid, id), None)
+            self.rings = rings
+
+        if ring is not None:
+            self.close_ring(ring)
+
+    def close(self):
+        """
+        Stops publishing and removes all shared memory blocks.
+        """
+
+        self.ipcon.remove_packet_tap(self.tap)
+
+        with self.lock:
+            rings = self.rings
+            self.rings = {}
+
+        for ring in rings.values():
+            self.close_ring(ring)
+
+    def close_ring(self, ring):
+        with ring.lock:
+            ring.closed = True
+            ring.buffer.release()
+            ring.memory.close()
+            ring.memory.unlink()
+
+        with created_names_lock:
+            created_names.discard(ring.memory.name)
+
+    def tap(self, packet):
+        ring = self.rings.get((get_uid_from_data(packet), get_function_id_from_data(packet)))
+
+        if ring is not None:
+            ring.write(self.clock_offset + monotonic(), packet[8:])
+
+class CallbackRingConsumer:
+    def __init__(self, name, from_start=False):
+        """
+        Attaches to the ring buffer with the given *name* that was created by
+        CallbackRingPublisher, possibly in another process. Only records
+        written after attaching are read, unless *from_start* is true.
+        """
+
+        check_shared_memory()
+
+        try:
+            self.memory = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # python before 3.13 registers attached blocks for removal on
+            # exit. the registration of a block created by this process is
+            # the one of its publisher, it is removed when the block is
+            # unlinked and must stay until then
+            self.memory = shared_memory.SharedMemory(name)
+
+            with created_names_lock:
+                created_here = self.memory.name in created_names
+
+            if not created_here:
+                try:
+                    from multiprocessing import resource_tracker
+                    resource_tracker.unregister(self.memory._name, 'shared_memory')
+                except (ImportError, AttributeError):
+                    pass
+
+        self.buffer = self.memory.buf
+
+        magic, version, self.capacity, self.record_size, write_count, form = \
+            struct.unpack_from(HEADER_FORMAT, self.buffer, 0)
+
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('Shared memory block {0} is not a callback ring'.format(name))
+
+        self.form = form.rstrip(b'\0').decode('ascii')
+        self.items = []
+        offset = 0
+
+        for f in self.form.split(' '):
+            self.items.append(('<' + f, offset, f[-1]))
+            offset += struct.calcsize('<' + f)
+
+        self.lost_count = 0
+
+        if from_start:
+            self.read_count = max(0, write_count - self.capacity)
+        else:
+            self.read_count = write_count
+
+    def close(self):
+        """
+        Detaches from the ring buffer.
+        """
+
+        self.buffer.release()
+        self.memory.close()
+
+    def get_lost_count(self):
+        """
+        Returns the number of records that were overwritten before they could
+        be read.
+        """
+
+        return self.lost_count
+
+    def read_raw(self, max_count=None):
+        """
+        Returns a list of (timestamp, payload) tuples for the records written
+        since the last read. The payload is packed in the callback format.
+        Records are copied out of the ring once, to detect if the publisher
+        overwrote them while reading.
+        """
+
+        write_count = struct.unpack_from('<Q', self.buffer, WRITE_COUNT_OFFSET)[0]
+
+        if write_count - self.read_count > self.capacity:
+            self.lost_count += write_count - self.capacity - self.read_count
+            self.read_count = write_count - self.capacity
+
+        if max_count is not None:
+            write_count = min(write_count, self.read_count + max_count)
+
+        records = []
+
+        while self.read_count < write_count:
+            offset = HEADER_SIZE + (self.read_count % self.capacity) * self.record_size
+            sequence_number, timestamp = struct.unpack_from(RECORD_HEADER_FORMAT, self.buffer, offset)
+            payload = bytes(self.buffer[offset + RECORD_HEADER_SIZE:offset + self.record_size])
+            self.read_count += 1
+
+            if sequence_number != self.read_count or \
+               struct.unpack_from('<Q', self.buffer, offset)[0] != sequence_number:
+                self.lost_count += 1
+                continue
+
+            records.append((timestamp, payload))
+
+        return records
+
+    def read(self, max_count=None):
+        """
+        Same as read_raw, but returns (timestamp, values) tuples with the
+        callback parameters decoded as tuple.
+        """
+
+        records = []
+
+        for timestamp, payload in self.read_raw(max_count):
+            values = []
+
+            for f, offset, kind in self.items:
+                x = struct.unpack_from(f, payload, offset)
+
+                if kind == 'c':
+                    x = tuple([c.decode('ascii') for c in x])
+                elif kind == 's':
+                    x = (x[0].split(b'\0')[0].decode('ascii'),)
+
+                if len(x) == 1:
+                    values.append(x[0])
+                else:
+                    values.append(x)
+
+            records.append((timestamp, tuple(values)))
+
+        return records
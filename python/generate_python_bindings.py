@@ -33,6 +33,9 @@ import common
 import python_common
 
 class PythonBindingsDevice(python_common.PythonDevice):
+    def is_led_strip(self):
+        return self.get_category() == 'Bricklet' and self.get_camel_case_name() == 'LEDStrip'
+
     def get_python_import(self):
         include = """# -*- coding: utf-8 -*-
 {0}
@@ -45,17 +48,20 @@ except ImportError:
         from ip_connection import namedtuple
 
 try:
-    from .ip_connection import Device, IPConnection, Error
+    from .ip_connection import {1}
 except ValueError:
-    from ip_connection import Device, IPConnection, Error
+    from ip_connection import {1}
 
 """
         date = datetime.datetime.now().strftime("%Y-%m-%d")
         version = common.get_changelog_version(self.get_generator().get_bindings_root_directory())
-        lower_type = self.get_category().lower()
+        names = ['Device', 'IPConnection', 'Error']
+
+        if self.is_led_strip():
+            names += ['Queue', 'Empty']
 
         return include.format(common.gen_text_hash.format(date, *version),
-                              lower_type, self.get_underscore_name())
+                              ', '.join(names))
 
     def get_python_namedtuples(self):
         tup = """{0} = namedtuple('{1}', [{2}])
@@ -143,6 +149,50 @@ class {0}(Device):
         if len(response_expected) > 0:
             response_expected += '\n'
 
+        response_cache = ''
+        functions = {}
+
+        for packet in self.get_packets('function'):
+            functions[packet.get_camel_case_name()] = packet
+
+        for packet in self.get_packets('function'):
+            name = packet.get_camel_case_name()
+
+            if not name.startswith('Get') or len(packet.get_elements('out')) == 0:
+                continue
+
+            setter = functions.get('Set' + name[3:])
+
+            if setter is not None:
+                response_cache += '        self.response_cache_invalidations[{0}.FUNCTION_{1}] = [{0}.FUNCTION_{2}]\n' \
+                    .format(self.get_python_class_name(), setter.get_upper_case_name(), packet.get_upper_case_name())
+
+            # only getters for configuration values that are changed by their
+            # setter alone are cacheable by default, not measurement getters
+            # or getters that also return state such as a remaining time
+            cacheable = name == 'GetIdentity'
+
+            if setter is not None and packet.get_doc()[0] in ['af', 'ccf']:
+                setter_names = [element.get_underscore_name() for element in setter.get_elements('in')]
+                cacheable = True
+
+                for element in packet.get_elements('out'):
+                    if element.get_underscore_name() not in setter_names:
+                        cacheable = False
+
+            if cacheable:
+                response_cache += '        self.response_cacheable[{0}.FUNCTION_{1}] = True\n' \
+                    .format(self.get_python_class_name(), packet.get_upper_case_name())
+
+        if len(response_cache) > 0:
+            response_expected += response_cache + '\n'
+
+        if self.is_led_strip():
+            response_expected += """        self.frame_rendered_queue = Queue()
+        self.frame_rendered_token = None
+
+"""
+
         return dev_init.format(*self.get_api_version()) + response_expected
 
     def get_python_callback_formats(self):
@@ -219,6 +269,98 @@ class {0}(Device):
         self.registered_callbacks[id] = callback
 """
 
+    def get_python_led_strip_methods(self):
+        if not self.is_led_strip():
+            return ''
+
+        methods = """
+    def set_rgb_frame(self, r, g=None, b=None, index=0, paced=False):
+        \"\"\"
+        Sets the *rgb* values for a whole frame of LEDs starting from *index*.
+
+        The frame is either given as three arrays *r*, *g* and *b* of equal
+        length, or as one array of (r, g, b) items or a flat r, g, b, r, g, b,
+        ... array in *r*. A numpy.ndarray of shape (N, 3) is accepted as well.
+
+        The frame is split into set_rgb_values requests of up to {1} LEDs
+        that are send in one write.
+
+        If *paced* is true, the frame is only send after the FrameRendered
+        callback for the previous paced frame arrived, waiting at most for
+        the timeout of the IP Connection. Pacing adds a listener to the
+        FrameRendered callback, a callback function registered for it is
+        still called. A paced frame cannot be set from a callback function,
+        because the FrameRendered callback is delivered by the same thread.
+        \"\"\"
+        if g is None and b is None:
+            ndim = getattr(r, 'ndim', None) # numpy.ndarray
+
+            if ndim == 2: # shape (N, 3)
+                r, g, b = r[:, 0], r[:, 1], r[:, 2]
+            elif ndim == 1 or (len(r) > 0 and not hasattr(r[0], '__len__')): # flat array
+                r, g, b = r[0::3], r[1::3], r[2::3]
+            else:
+                items = r
+                r = [item[0] for item in items]
+                g = [item[1] for item in items]
+                b = [item[2] for item in items]
+        elif g is None or b is None:
+            raise ValueError('Either r, g and b or only r has to be given')
+
+        length = len(r)
+
+        if len(g) != length or len(b) != length:
+            raise ValueError('Length of r, g and b arrays differ')
+
+        data_list = []
+
+        for offset in range(0, length, {1}):
+            chunk_length = min({1}, length - offset)
+            chunk_r = r[offset:offset + chunk_length]
+            chunk_g = g[offset:offset + chunk_length]
+            chunk_b = b[offset:offset + chunk_length]
+
+            if chunk_length < {1}:
+                padding = [0] * ({1} - chunk_length)
+                chunk_r = list(chunk_r) + padding
+                chunk_g = list(chunk_g) + padding
+                chunk_b = list(chunk_b) + padding
+
+            data_list.append((index + offset, chunk_length, chunk_r, chunk_g, chunk_b))
+
+        if paced:
+            if self.frame_rendered_token is None:
+                # a listener instead of a registered callback, so the callback
+                # function of the user stays untouched. there is no previous
+                # frame to wait for yet
+                self.frame_rendered_token = self.add_listener({0}.CALLBACK_FRAME_RENDERED,
+                                                              self.handle_frame_rendered)
+            else:
+                try:
+                    self.frame_rendered_queue.get(True, self.ipcon.timeout)
+                except Empty:
+                    raise Error(Error.TIMEOUT, 'Did not receive frame rendered callback in time')
+
+        self.ipcon.send_requests(self, {0}.FUNCTION_SET_RGB_VALUES, data_list, '{2}')
+
+    def handle_frame_rendered(self, length):
+        # only keep the most recent frame rendered notification
+        try:
+            self.frame_rendered_queue.get_nowait()
+        except Empty:
+            pass
+
+        self.frame_rendered_queue.put(length)
+"""
+
+        for packet in self.get_packets('function'):
+            if packet.get_camel_case_name() == 'SetRGBValues':
+                return methods.format(self.get_python_class_name(),
+                                      packet.get_elements('in')[2].get_cardinality(),
+                                      packet.get_python_format_list('in'))
+
+        raise Exception('LED Strip Bricklet is missing SetRGBValues function')
+
     def get_python_old_name(self):
         return """
 {0} = {1} # for backward compatibility
@@ -234,6 +376,7 @@ class {0}(Device):
         source += self.get_python_init_method()
         source += self.get_python_callback_formats()
         source += self.get_python_methods()
+        source += self.get_python_led_strip_methods()
         source += self.get_python_register_callback_method()
         source += self.get_python_old_name()
 
@@ -264,6 +407,11 @@ class PythonBindingsPacket(python_common.PythonPacket):
 class PythonBindingsGenerator(common.BindingsGenerator):
     released_files_name_prefix = 'python'
 
+    def __init__(self, *args, **kwargs):
+        common.BindingsGenerator.__init__(self, *args, **kwargs)
+
+        self.device_classes = []
+
     def get_bindings_name(self):
         return 'python'
 
@@ -285,6 +433,83 @@ class PythonBindingsGenerator(common.BindingsGenerator):
 
         if device.is_released():
             self.released_files.append(filename)
+            self.device_classes.append((device.get_device_identifier(),
+                                        filename[:-3],
+                                        device.get_python_class_name()))
+
+    def finish(self):
+        common.BindingsGenerator.finish(self)
+
+        init = """# -*- coding: utf-8 -*-
+{0}
+# Device modules are imported on first use only. On Python 3.7 and newer the
+# device classes and ip_connection names are also available as attributes of
+# this package, e.g. tinkerforge.BrickletLEDStrip, without importing all
+# device modules up front.
+
+# device identifier -> (module name, class name)
+DEVICE_CLASSES = {{
+{1}
+}}
+
+# class name -> module name
+CLASS_MODULES = {{
+{2}
+}}
+
+for _name in ['IPConnection', 'Device', 'Error']:
+    CLASS_MODULES[_name] = 'ip_connection'
+
+del _name
+
+def _import_module(module_name):
+    return __import__(module_name, globals(), locals(), ['__name__'], 1)
+
+def get_device_class(device_identifier):
+    \"\"\"
+    Returns the device class for the given *device_identifier*. Only the
+    module of this device class is imported.
+    \"\"\"
+
+    try:
+        module_name, class_name = DEVICE_CLASSES[device_identifier]
+    except KeyError:
+        raise ValueError('Unknown device identifier {{0}}'.format(device_identifier))
+
+    return getattr(_import_module(module_name), class_name)
+
+def create_device(device_identifier, uid, ipcon):
+    \"\"\"
+    Creates a device object for the given *device_identifier* with the unique
+    device ID *uid* and adds it to the IP Connection *ipcon*. Only the module
+    of the device class is imported.
+    \"\"\"
+
+    return get_device_class(device_identifier)(uid, ipcon)
+
+def __getattr__(name):
+    if name in CLASS_MODULES:
+        return getattr(_import_module(CLASS_MODULES[name]), name)
+
+    raise AttributeError("module '{{0}}' has no attribute '{{1}}'".format(__name__, name))
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(CLASS_MODULES.keys()))
+"""
+        date = datetime.datetime.now().strftime("%Y-%m-%d")
+        version = common.get_changelog_version(self.get_bindings_root_directory())
+        device_classes = []
+        class_modules = []
+
+        for device_identifier, module_name, class_name in sorted(self.device_classes):
+            device_classes.append("    {0}: ('{1}', '{2}')".format(device_identifier, module_name, class_name))
+            class_modules.append("    '{0}': '{1}'".format(class_name, module_name))
+
+        py = open(os.path.join(self.get_bindings_root_directory(), 'bindings', '__init__.py'), 'wb')
+        py.write(init.format(common.gen_text_hash.format(date, *version),
+                             ',\n'.join(device_classes),
+                             ',\n'.join(class_modules)))
+        py.close()
 
 def generate(bindings_root_directory):
     common.generate(bindings_root_directory, 'en', PythonBindingsGenerator)
@@ -33,6 +33,16 @@ sys.path.append(os.path.split(os.getcwd())[0])
 import common
 from python_released_files import released_files
 
+# hand-written modules of the tinkerforge package
+runtime_files = ['ip_connection.py',
+                 'topology_cache.py',
+                 'ip_connection_pool.py',
+                 'brick_proxy.py',
+                 'callback_pipeline.py',
+                 'callback_recorder.py',
+                 'callback_ring.py',
+                 'polling_scheduler.py']
+
 class PythonZipGenerator(common.Generator):
     def get_bindings_name(self):
         return 'python'
@@ -68,7 +78,11 @@ class PythonZipGenerator(common.Generator):
         for filename in released_files:
             shutil.copy(os.path.join(root, 'bindings', filename), '/tmp/generator/egg/source/tinkerforge')
 
-        shutil.copy(os.path.join(root, 'ip_connection.py'), '/tmp/generator/egg/source/tinkerforge')
+        shutil.copy(os.path.join(root, 'bindings', '__init__.py'), '/tmp/generator/egg/source/tinkerforge')
+
+        for filename in runtime_files:
+            shutil.copy(os.path.join(root, filename), '/tmp/generator/egg/source/tinkerforge')
+
         shutil.copy(os.path.join(root, 'changelog.txt'), '/tmp/generator/egg')
         shutil.copy(os.path.join(root, 'readme.txt'), '/tmp/generator/egg')
 
@@ -104,9 +118,6 @@ setup(name='tinkerforge',
                     '/tmp/generator/egg/tinkerforge.egg')
         shutil.rmtree('/tmp/generator/egg/source/dist')
 
-        # Make __init__.py
-        file('/tmp/generator/egg/source/tinkerforge/__init__.py', 'wb').write(' ')
-
         # Make zip
         common.make_zip(self.get_bindings_name(), '/tmp/generator/egg', root, version)
 
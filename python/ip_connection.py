@@ -29,6 +29,19 @@ import os
 import math
 import hmac
 import hashlib
+import array
+
+# numpy is optional, it is only required for ARRAY_MODE_NUMPY
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# memoryview for python 2.7 and newer, setters fall back to struct.pack without it
+try:
+    memoryview
+except NameError:
+    memoryview = None
 
 # use normal tuples instead of namedtuples in python version below 2.6
 if sys.hexversion < 0x02060000:
@@ -40,6 +53,11 @@ if sys.hexversion < 0x02060000:
 else:
     from collections import namedtuple
 
+ResponseCacheStatistics = namedtuple('ResponseCacheStatistics', ['hits', 'misses'])
+RequestTrace = namedtuple('RequestTrace', ['uid', 'function_id', 'sequence_number', 'created', 'lock_acquired', 'sent', 'received', 'returned'])
+CallbackTrace = namedtuple('CallbackTrace', ['uid', 'function_id', 'received', 'dequeued', 'returned'])
+EndpointEnumeration = namedtuple('EndpointEnumeration', ['host', 'port', 'uid', 'connected_uid', 'position', 'hardware_version', 'firmware_version', 'device_identifier', 'enumeration_type'])
+
 def get_uid_from_data(data):
     return struct.unpack('<I', data[0:4])[0]
 
@@ -55,6 +73,51 @@ def get_sequence_number_from_data(data):
 def get_error_code_from_data(data):
     return (struct.unpack('<B', data[7:8])[0] >> 6) & 0x03
 
+def get_enumerate_uid_from_data(data):
+    encoded = data[8:16]
+
+    if sys.hexversion >= 0x03000000:
+        encoded = encoded.decode('ascii')
+
+    i = encoded.find(chr(0))
+    if i >= 0:
+        encoded = encoded[:i]
+
+    uid = base58decode(encoded)
+
+    if uid > 0xFFFFFFFF:
+        uid = uid64_to_uid32(uid)
+
+    return uid
+
+def get_enumeration_type_from_data(data):
+    return struct.unpack('<B', data[33:34])[0]
+
+def get_array_typecodes():
+    # array.array item sizes are platform dependent, pick the typecode that
+    # matches the little endian struct size of each numeric struct format
+    candidates = {'b': 'bhilq', 'B': 'BHILQ',
+                  'h': 'bhilq', 'H': 'BHILQ',
+                  'i': 'bhilq', 'I': 'BHILQ',
+                  'q': 'bhilq', 'Q': 'BHILQ',
+                  'f': 'f'}
+    typecodes = {}
+
+    for f, typecodes_to_try in candidates.items():
+        size = struct.calcsize('<' + f)
+
+        for typecode in typecodes_to_try:
+            try:
+                if array.array(typecode).itemsize == size:
+                    typecodes[f] = typecode
+                    break
+            except ValueError:
+                pass # 'q' and 'Q' are not available before python 3.3
+
+    return typecodes
+
+ARRAY_TYPECODES = get_array_typecodes()
+
 BASE58 = '123456789abcdefghijkmnopqrstuvwxyzABCDEFGHJKLMNPQRSTUVWXYZ'
 def base58encode(value):
     encoded = ''
@@ -102,6 +165,49 @@ class Error(Exception):
     def __str__(self):
         return str(self.value) + ': ' + str(self.description)
 
+class ListenerRegistry:
+    def __init__(self):
+        self.listeners = {} # id -> tuple of (token, listener, executor), replaced on change
+        self.next_token = 1 # protected by lock
+        self.lock = Lock()
+
+    def add(self, id, listener, executor):
+        with self.lock:
+            token = self.next_token
+            self.next_token += 1
+            self.listeners[id] = self.listeners.get(id, ()) + ((token, listener, executor),)
+
+        return token
+
+    def remove(self, token):
+        with self.lock:
+            for id, listeners in list(self.listeners.items()):
+                remaining = tuple([entry for entry in listeners if entry[0] != token])
+
+                if len(remaining) == len(listeners):
+                    continue
+
+                if len(remaining) > 0:
+                    self.listeners[id] = remaining
+                else:
+                    del self.listeners[id]
+
+                return
+
+        raise ValueError('Invalid listener token {0}'.format(token))
+
+    def has(self, id):
+        return id in self.listeners
+
+    def call(self, id, args):
+        # the tuple is only replaced, never modified, so it is safe to
+        # iterate it without holding the lock
+        for token, listener, executor in self.listeners.get(id, ()):
+            if executor is None:
+                listener(*args)
+            else:
+                executor.submit(listener, *args)
+
 class Device:
     RESPONSE_EXPECTED_INVALID_FUNCTION_ID = 0
     RESPONSE_EXPECTED_ALWAYS_TRUE = 1 # getter
@@ -124,10 +230,13 @@ class Device:
         self.ipcon = ipcon
         self.api_version = (0, 0, 0)
         self.registered_callbacks = {}
+        self.registered_listeners = ListenerRegistry()
         self.callback_formats = {}
         self.expected_response_function_id = None # protected by request_lock
         self.expected_response_sequence_number = None # protected by request_lock
-        self.response_queue = Queue()
+        self.expected_response_window = None # protected by request_lock
+        self.stale_window_requests = {} # (function_id, sequence_number) -> write off time, protected by request_lock
+        self.response_queue = Queue() # (packet, receive time)
         self.request_lock = Lock()
 
         self.response_expected = [Device.RESPONSE_EXPECTED_INVALID_FUNCTION_ID] * 256
@@ -140,6 +249,10 @@ class Device:
         self.response_expected[IPConnection.FUNCTION_WRITE_BRICKLET_PLUGIN] = Device.RESPONSE_EXPECTED_ALWAYS_TRUE
         self.response_expected[IPConnection.CALLBACK_ENUMERATE] = Device.RESPONSE_EXPECTED_ALWAYS_FALSE
 
+        self.response_cache_ttl = [None] * 256
+        self.response_cacheable = [False] * 256 # getters that only change by a setter call
+        self.response_cache_invalidations = {} # setter function ID -> list of getter function IDs
+
         ipcon.devices[self.uid] = self # FIXME: maybe use a weakref here
 
     def get_api_version(self):
@@ -225,6 +338,86 @@ class Device:
             if self.response_expected[i] in [Device.RESPONSE_EXPECTED_TRUE, Device.RESPONSE_EXPECTED_FALSE]:
                 self.response_expected[i] = flag
 
+    def get_response_cache_ttl(self, function_id):
+        """
+        Returns the time-to-live in seconds for cached responses of the getter
+        function specified by the *function_id* parameter, or *None* if its
+        responses are not cached.
+        """
+
+        if function_id < 0 or function_id >= len(self.response_cache_ttl):
+            raise ValueError('Function ID {0} out of range'.format(function_id))
+
+        return self.response_cache_ttl[function_id]
+
+    def set_response_cache_ttl(self, function_id, ttl):
+        """
+        Enables caching of responses for the getter function specified by the
+        *function_id* parameter. A response is reused for *ttl* seconds for
+        calls with the same parameters instead of sending a request to the
+        device. Calling the matching setter function invalidates the cached
+        responses of this getter. A *ttl* of *None* disables caching.
+
+        Only enable caching for getters that return values that are not
+        changed by the device itself, such as configuration values.
+        """
+
+        if function_id < 0 or function_id >= len(self.response_cache_ttl):
+            raise ValueError('Function ID {0} out of range'.format(function_id))
+
+        if self.response_expected[function_id] != Device.RESPONSE_EXPECTED_ALWAYS_TRUE:
+            raise ValueError('Responses can only be cached for getter function IDs, not for {0}'.format(function_id))
+
+        if ttl is not None:
+            ttl = float(ttl)
+
+            if ttl < 0:
+                raise ValueError('TTL cannot be negative')
+
+        self.response_cache_ttl[function_id] = ttl
+        self.ipcon.invalidate_cached_responses(self, [function_id])
+
+    def set_response_cache_ttl_all(self, ttl):
+        """
+        Changes the response cache time-to-live for all getter functions of
+        this device at once that only return values that are changed by a
+        setter function, such as configuration and callback period getters.
+        """
+
+        function_ids = []
+
+        for i in range(len(self.response_cacheable)):
+            if self.response_cacheable[i]:
+                function_ids.append(i)
+
+        for function_id in function_ids:
+            self.set_response_cache_ttl(function_id, ttl)
+
+    def add_listener(self, id, listener, executor=None):
+        """
+        Adds *listener* to the callback with ID *id* in addition to the
+        registered callback and the other listeners. The callback payload is
+        only decoded once and the same values are passed to all of them.
+
+        Without *executor* the listener is called on the callback thread,
+        otherwise it is passed to the submit method of *executor*, e.g. a
+        concurrent.futures.ThreadPoolExecutor.
+
+        Returns a token for remove_listener.
+        """
+
+        if id not in self.callback_formats:
+            raise ValueError('Invalid callback ID {0}'.format(id))
+
+        return self.registered_listeners.add(id, listener, executor)
+
+    def remove_listener(self, token):
+        """
+        Removes the listener that was added with the returned *token*.
+        """
+
+        self.registered_listeners.remove(token)
+
 class BrickDaemon(Device):
     FUNCTION_GET_AUTHENTICATION_NONCE = 1
     FUNCTION_AUTHENTICATE = 2
@@ -260,6 +453,12 @@ class IPConnection:
     BROADCAST_UID = 0
 
     PLUGIN_CHUNK_SIZE = 32
+    PLUGIN_MAX_CHUNK_COUNT = 256 # position is an uint8
+
+    # sequence numbers 1 to 15 are used for requests, keep one unused so
+    # that a request in a window can always get a sequence number that is
+    # not already in flight
+    MAX_REQUEST_WINDOW = 14
 
     # enumeration_type parameter to the enumerate callback
     ENUMERATION_TYPE_AVAILABLE = 0
@@ -284,6 +483,11 @@ class IPConnection:
     QUEUE_META = 1
     QUEUE_PACKET = 2
 
+    # returned by get_array_mode
+    ARRAY_MODE_TUPLE = 0
+    ARRAY_MODE_ARRAY = 1 # array.array
+    ARRAY_MODE_NUMPY = 2 # numpy.ndarray
+
     DISCONNECT_PROBE_INTERVAL = 5
 
     class CallbackContext:
@@ -303,6 +507,8 @@ class IPConnection:
         self.port = None
         self.secret = None # protected by socket_lock
         self.timeout = 2.5
+        self.connect_timeout = None # None blocks until the OS gives up
+        self.array_mode = IPConnection.ARRAY_MODE_TUPLE
         self.auto_reconnect = True
         self.auto_reconnect_allowed = False
         self.auto_reconnect_pending = False
@@ -312,6 +518,11 @@ class IPConnection:
         self.next_authenticate_nonce = 0 # protected by sequence_number_lock
         self.devices = {}
         self.registered_callbacks = {}
+        self.registered_listeners = ListenerRegistry()
+        self.packet_taps = () # replaced on change, protected by packet_tap_lock
+        self.packet_tap_lock = Lock()
+        self.trace_sink = None
+        self.callback_receive_timestamp = None # only valid on the callback thread and while tracing
         self.socket = None # protected by socket_lock
         self.socket_id = 0 # protected by socket_lock
         self.socket_lock = Lock()
@@ -323,6 +534,15 @@ class IPConnection:
         self.disconnect_probe_queue = None
         self.disconnect_probe_thread = None
         self.waiter = Semaphore()
+        self.response_cache = {} # protected by response_cache_lock
+        # a response is only stored if no invalidation happened while its
+        # request was in flight. invalidation bumps the generation of the
+        # affected keys, clearing the whole cache bumps the epoch
+        self.response_cache_generations = {} # cache key -> generation, protected by response_cache_lock
+        self.response_cache_epoch = 0 # protected by response_cache_lock
+        self.response_cache_lock = Lock()
+        self.response_cache_hits = 0 # protected by response_cache_lock
+        self.response_cache_misses = 0 # protected by response_cache_lock
         self.brickd = BrickDaemon("2", self)
 
     def connect(self, host, port):
@@ -497,6 +717,108 @@ class IPConnection:
 
         return self.timeout
 
+    def set_array_mode(self, array_mode):
+        """
+        Sets how array values with more than one element are returned by
+        getters and passed to callbacks:
+
+        - ARRAY_MODE_TUPLE: As tuple of int, float or bool values.
+        - ARRAY_MODE_ARRAY: As array.array copied from the response payload.
+          Bool arrays are still returned as tuple.
+        - ARRAY_MODE_NUMPY: As read-only numpy.ndarray view over the
+          response payload. Requires NumPy.
+
+        Char arrays and strings are not affected by this setting. Setters
+        accept lists, tuples, array.array, numpy.ndarray and other buffer
+        objects regardless of this setting. Buffers with matching item
+        format are copied into the request as they are.
+
+        Default value is ARRAY_MODE_TUPLE.
+        """
+
+        if array_mode not in [IPConnection.ARRAY_MODE_TUPLE,
+                              IPConnection.ARRAY_MODE_ARRAY,
+                              IPConnection.ARRAY_MODE_NUMPY]:
+            raise ValueError('Invalid array mode {0}'.format(array_mode))
+
+        if array_mode == IPConnection.ARRAY_MODE_NUMPY and numpy is None:
+            raise ValueError('Array mode {0} requires NumPy'.format(array_mode))
+
+        self.array_mode = array_mode
+
+    def get_array_mode(self):
+        """
+        Returns the array mode as set by set_array_mode.
+        """
+
+        return self.array_mode
+
+    def get_response_cache_statistics(self):
+        """
+        Returns the number of getter calls that were answered from the
+        response cache (hits) and that had to send a request because there
+        was no valid cached response (misses). Only getters with enabled
+        response cache are counted, see Device.set_response_cache_ttl.
+        """
+
+        with self.response_cache_lock:
+            return ResponseCacheStatistics(self.response_cache_hits, self.response_cache_misses)
+
+    def set_trace_sink(self, trace_sink):
+        """
+        Enables tracing of requests and callbacks. *trace_sink* is called with
+        a RequestTrace for every request and a CallbackTrace for every
+        dispatched callback, *None* disables tracing. All timestamps are in
+        seconds since the epoch as returned by time.time.
+
+        A RequestTrace contains the time the request was created, the time
+        the socket locks were acquired, the time the request was sent, the
+        time the response was received (*None* if no response was expected)
+        and the time the function returned. It is passed to *trace_sink* on
+        the calling thread.
+
+        A CallbackTrace contains the time the callback was received and
+        queued, the time it was taken from the queue and the time the
+        callback function and listeners returned. It is passed to
+        *trace_sink* on the callback thread.
+
+        Requests answered from the response cache and requests that run into
+        a timeout are not traced.
+        """
+
+        self.trace_sink = trace_sink
+
+        if trace_sink is None:
+            self.callback_receive_timestamp = None
+
+    def get_trace_sink(self):
+        """
+        Returns the trace sink as set by set_trace_sink.
+        """
+
+        return self.trace_sink
+
+    def get_callback_receive_timestamp(self):
+        """
+        Returns the time the callback that is currently dispatched was
+        received, in seconds since the epoch. Only valid when called from a
+        callback function or a listener without executor and while a trace
+        sink is set, *None* otherwise.
+        """
+
+        return self.callback_receive_timestamp
+
+    def clear_response_cache(self):
+        """
+        Removes all cached responses and resets the statistics.
+        """
+
+        with self.response_cache_lock:
+            self.response_cache = {}
+            self.response_cache_epoch += 1
+            self.response_cache_hits = 0
+            self.response_cache_misses = 0
+
     def enumerate(self):
         """
         Broadcasts an enumerate request. All devices will respond with an
@@ -536,6 +858,54 @@ class IPConnection:
 
         self.registered_callbacks[id] = callback
 
+    def add_listener(self, id, listener, executor=None):
+        """
+        Adds *listener* to the callback with ID *id* in addition to the
+        registered callback and the other listeners. The enumerate callback
+        payload is only decoded once and the same values are passed to all of
+        them.
+
+        Without *executor* the listener is called on the callback thread,
+        otherwise it is passed to the submit method of *executor*, e.g. a
+        concurrent.futures.ThreadPoolExecutor.
+
+        Returns a token for remove_listener.
+        """
+
+        if id not in [IPConnection.CALLBACK_ENUMERATE,
+                      IPConnection.CALLBACK_CONNECTED,
+                      IPConnection.CALLBACK_DISCONNECTED]:
+            raise ValueError('Invalid callback ID {0}'.format(id))
+
+        return self.registered_listeners.add(id, listener, executor)
+
+    def remove_listener(self, token):
+        """
+        Removes the listener that was added with the returned *token*.
+        """
+
+        self.registered_listeners.remove(token)
+
+    def add_packet_tap(self, tap):
+        """
+        Adds *tap* to be called with every raw callback packet on the receive
+        thread, before the packet is queued for the callback thread. The tap
+        has to return quickly, it blocks the receiving of responses.
+        """
+
+        with self.packet_tap_lock:
+            self.packet_taps = self.packet_taps + (tap,)
+
+    def remove_packet_tap(self, tap):
+        """
+        Removes *tap* that was added with add_packet_tap.
+        """
+
+        # compare by equality, each access to a bound method creates a new
+        # object, so an identity check would never match bound method taps
+        with self.packet_tap_lock:
+            self.packet_taps = tuple([t for t in self.packet_taps if t != tap])
+
     def connect_unlocked(self, is_auto_reconnect):
         # NOTE: assumes that socket_lock is locked
 
@@ -555,11 +925,18 @@ class IPConnection:
                 self.callback = None
                 raise
 
+        # the devices might have been reset while disconnected
+        with self.response_cache_lock:
+            self.response_cache = {}
+            self.response_cache_epoch += 1
+
         # create and connect socket
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.socket.settimeout(self.connect_timeout)
             self.socket.connect((self.host, self.port))
+            self.socket.settimeout(None)
             self.socket_id += 1
         except:
             def cleanup():
@@ -725,6 +1102,8 @@ class IPConnection:
             if IPConnection.CALLBACK_CONNECTED in self.registered_callbacks and \
                self.registered_callbacks[IPConnection.CALLBACK_CONNECTED] is not None:
                 self.registered_callbacks[IPConnection.CALLBACK_CONNECTED](parameter)
+
+            self.registered_listeners.call(IPConnection.CALLBACK_CONNECTED, (parameter,))
         elif function_id == IPConnection.CALLBACK_DISCONNECTED:
             if parameter != IPConnection.DISCONNECT_REASON_REQUEST:
                 # need to do this here, the receive_loop is not allowed to
@@ -752,6 +1131,8 @@ class IPConnection:
                self.registered_callbacks[IPConnection.CALLBACK_DISCONNECTED] is not None:
                 self.registered_callbacks[IPConnection.CALLBACK_DISCONNECTED](parameter)
 
+            self.registered_listeners.call(IPConnection.CALLBACK_DISCONNECTED, (parameter,))
+
             if parameter != IPConnection.DISCONNECT_REASON_REQUEST and \
                self.auto_reconnect and self.auto_reconnect_allowed:
                 self.auto_reconnect_pending = True
@@ -788,33 +1169,43 @@ class IPConnection:
         function_id = get_function_id_from_data(packet)
         payload = packet[8:]
 
-        if function_id == IPConnection.CALLBACK_ENUMERATE and \
-           IPConnection.CALLBACK_ENUMERATE in self.registered_callbacks:
-            uid, connected_uid, position, hardware_version, \
-                firmware_version, device_identifier, enumeration_type = \
-                self.deserialize_data(payload, '8s 8s c 3B 3B H B')
+        if function_id == IPConnection.CALLBACK_ENUMERATE:
+            cb = self.registered_callbacks.get(IPConnection.CALLBACK_ENUMERATE)
+
+            if cb is None and not self.registered_listeners.has(IPConnection.CALLBACK_ENUMERATE):
+                return
+
+            args = self.deserialize_data(payload, '8s 8s c 3B 3B H B')
 
-            cb = self.registered_callbacks[IPConnection.CALLBACK_ENUMERATE]
-            cb(uid, connected_uid, position, hardware_version,
-               firmware_version, device_identifier, enumeration_type)
+            if cb is not None:
+                cb(*args)
+
+            self.registered_listeners.call(IPConnection.CALLBACK_ENUMERATE, args)
             return
 
         if uid not in self.devices:
             return
 
         device = self.devices[uid]
+        cb = device.registered_callbacks.get(function_id)
 
-        if function_id in device.registered_callbacks and \
-           device.registered_callbacks[function_id] is not None:
-            cb = device.registered_callbacks[function_id]
-            form = device.callback_formats[function_id]
+        if cb is None and not device.registered_listeners.has(function_id):
+            return
 
-            if len(form) == 0:
-                cb()
-            elif len(form) == 1:
-                cb(self.deserialize_data(payload, form))
-            else:
-                cb(*self.deserialize_data(payload, form))
+        form = device.callback_formats[function_id]
+
+        # decode once for the callback and all listeners
+        if len(form) == 0:
+            args = ()
+        elif len(form) == 1:
+            args = (self.deserialize_data(payload, form),)
+        else:
+            args = tuple(self.deserialize_data(payload, form))
+
+        if cb is not None:
+            cb(*args)
+
+        device.registered_listeners.call(function_id, args)
 
     def callback_loop(self, callback):
         while True:
@@ -831,7 +1222,21 @@ class IPConnection:
                 elif kind == IPConnection.QUEUE_PACKET:
                     # don't dispatch callbacks when the receive thread isn't running
                     if callback.packet_dispatch_allowed:
-                        self.dispatch_packet(data)
+                        packet, received = data
+                        trace_sink = self.trace_sink
+
+                        if trace_sink is not None:
+                            dequeued = time.time()
+
+                        if trace_sink is not None:
+                            self.callback_receive_timestamp = received
+
+                        self.dispatch_packet(packet)
+
+                        if trace_sink is not None:
+                            trace_sink(CallbackTrace(get_uid_from_data(packet),
+                                                     get_function_id_from_data(packet),
+                                                     received, dequeued, time.time()))
 
     # NOTE: the disconnect probe thread is not allowed to hold the socket_lock at any
     #       time because it is created and joined while the socket_lock is locked
@@ -858,11 +1263,20 @@ class IPConnection:
 
     def deserialize_data(self, data, form):
         ret = []
+        offset = 0
+        array_mode = self.array_mode
+
         for f in form.split(' '):
             f = '<' + f
             length = struct.calcsize(f)
 
-            x = struct.unpack(f, data[:length])
+            if array_mode != IPConnection.ARRAY_MODE_TUPLE and len(f) > 2 and \
+               (f[-1] in ARRAY_TYPECODES or (f[-1] == '?' and array_mode == IPConnection.ARRAY_MODE_NUMPY)):
+                ret.append(self.deserialize_array(data, offset, f, length, array_mode))
+                offset += length
+                continue
+
+            x = struct.unpack_from(f, data, offset)
             if len(x) > 1:
                 if 'c' in f:
                     x = tuple([self.handle_deserialized_char(c) for c in x])
@@ -874,13 +1288,31 @@ class IPConnection:
             else:
                 ret.append(x[0])
 
-            data = data[length:]
+            offset += length
 
         if len(ret) == 1:
             return ret[0]
         else:
             return ret
 
+    def deserialize_array(self, data, offset, f, length, array_mode):
+        if array_mode == IPConnection.ARRAY_MODE_NUMPY:
+            dtype = numpy.dtype('<' + f[-1])
+
+            return numpy.frombuffer(data, dtype, length // dtype.itemsize, offset)
+
+        a = array.array(ARRAY_TYPECODES[f[-1]])
+
+        if sys.hexversion < 0x03020000:
+            a.fromstring(data[offset:offset + length])
+        else:
+            a.frombytes(data[offset:offset + length])
+
+        if a.itemsize > 1 and sys.byteorder != 'little':
+            a.byteswap()
+
+        return a
+
     def handle_deserialized_char(self, c):
         if sys.hexversion >= 0x03000000:
             c = c.decode('ascii')
@@ -897,21 +1329,28 @@ class IPConnection:
 
         return s
 
-    def send(self, packet):
+    def send(self, packet, timestamps=None):
+        # timestamps gets the lock acquisition and send times if not None
         with self.socket_lock:
             if self.socket is None:
                 raise Error(Error.NOT_CONNECTED, 'Not connected')
 
             try:
                 with self.socket_send_lock:
-                    self.socket.send(packet)
+                    if timestamps is not None:
+                        timestamps.append(time.time())
+
+                    self.socket.sendall(packet)
+
+                    if timestamps is not None:
+                        timestamps.append(time.time())
             except socket.error:
                 self.handle_disconnect_by_peer(IPConnection.DISCONNECT_REASON_ERROR, None, True)
                 raise Error(Error.NOT_CONNECTED, 'Not connected')
 
             self.disconnect_probe_flag = False
 
-    def send_request(self, device, function_id, data, form, form_ret):
+    def create_request(self, device, function_id, data, form):
         length = 8 + struct.calcsize('<' + form)
         request, response_expected, sequence_number = \
             self.create_packet_header(device, length, function_id)
@@ -932,9 +1371,28 @@ class IPConnection:
                 else:
                     return struct.pack('<' + f, d)
 
+        def pack_array(f, d):
+            # copy buffers with matching item format as they are, this
+            # avoids creating an int object per item for array.array,
+            # numpy.ndarray, bytes and bytearray values
+            if memoryview is not None and not isinstance(d, (list, tuple)):
+                try:
+                    view = memoryview(d)
+                except TypeError:
+                    view = None
+
+                if view is not None and view.format.lstrip('<=@') == f[-1] and \
+                   (view.itemsize == 1 or sys.byteorder == 'little'):
+                    packed = view.tobytes()
+
+                    if len(packed) == struct.calcsize('<' + f):
+                        return packed
+
+            return struct.pack('<' + f, *d)
+
         for f, d in zip(form.split(' '), data):
             if len(f) > 1 and not 's' in f and not 'c' in f:
-                request += struct.pack('<' + f, *d)
+                request += pack_array(f, d)
             elif 's' in f:
                 request += pack_string(f, d)
             elif 'c' in f:
@@ -948,16 +1406,57 @@ class IPConnection:
             else:
                 request += struct.pack('<' + f, d)
 
+        return request, response_expected, sequence_number
+
+    def send_request(self, device, function_id, data, form, form_ret):
+        trace_sink = self.trace_sink
+
+        if trace_sink is not None:
+            created = time.time()
+            timestamps = []
+        else:
+            timestamps = None
+
+        request, response_expected, sequence_number = \
+            self.create_request(device, function_id, data, form)
+
+        ttl = device.response_cache_ttl[function_id]
+        invalidations = None
+
+        if ttl is not None:
+            cache_key = (device.uid, function_id)
+            now = time.time()
+
+            with self.response_cache_lock:
+                try:
+                    expiry, response = self.response_cache[cache_key][request[8:]]
+                except KeyError:
+                    expiry = None
+
+                if expiry is not None and expiry > now:
+                    self.response_cache_hits += 1
+                else:
+                    self.response_cache_misses += 1
+                    response = None
+                    generation = self.get_response_cache_generation(cache_key)
+
+            if response is not None:
+                return self.deserialize_data(response[8:], form_ret)
+        elif function_id in device.response_cache_invalidations:
+            invalidations = device.response_cache_invalidations[function_id]
+
+            self.invalidate_cached_responses(device, invalidations)
+
         if response_expected:
             with device.request_lock:
                 device.expected_response_function_id = function_id
                 device.expected_response_sequence_number = sequence_number
 
                 try:
-                    self.send(request)
+                    self.send(request, timestamps)
 
                     while True:
-                        response = device.response_queue.get(True, self.timeout)
+                        response, received = device.response_queue.get(True, self.timeout)
 
                         if function_id == get_function_id_from_data(response) and \
                            sequence_number == get_sequence_number_from_data(response):
@@ -971,25 +1470,249 @@ class IPConnection:
                     device.expected_response_function_id = None
                     device.expected_response_sequence_number = None
 
-            error_code = get_error_code_from_data(response)
+                    # a getter answered between the invalidation above and
+                    # the device applying this setter cached the old value
+                    if invalidations is not None:
+                        self.invalidate_cached_responses(device, invalidations)
 
-            if error_code == 0:
-                # no error
-                pass
-            elif error_code == 1:
-                msg = 'Got invalid parameter for function {0}'.format(function_id)
-                raise Error(Error.INVALID_PARAMETER, msg)
-            elif error_code == 2:
-                msg = 'Function {0} is not supported'.format(function_id)
-                raise Error(Error.NOT_SUPPORTED, msg)
-            else:
-                msg = 'Function {0} returned an unknown error'.format(function_id)
-                raise Error(Error.UNKNOWN_ERROR_CODE, msg)
+            self.check_error_code(response, function_id)
+
+            if ttl is not None:
+                with self.response_cache_lock:
+                    # the response might predate an invalidation that happened
+                    # while the request was in flight, don't cache it then
+                    if generation == self.get_response_cache_generation(cache_key):
+                        self.response_cache.setdefault(cache_key, {})[request[8:]] = (now + ttl, response)
 
             if len(form_ret) > 0:
-                return self.deserialize_data(response[8:], form_ret)
+                result = self.deserialize_data(response[8:], form_ret)
+            else:
+                result = None
+        else:
+            self.send(request, timestamps)
+
+            # a getter sent between the invalidation above and this setter
+            # cached the old value. later getters are answered after the
+            # device applied the setter
+            if invalidations is not None:
+                self.invalidate_cached_responses(device, invalidations)
+
+            result = None
+            received = None
+
+        if trace_sink is not None:
+            trace_sink(RequestTrace(device.uid, function_id, sequence_number, created,
+                                    timestamps[0], timestamps[1], received, time.time()))
+
+        return result
+
+    def get_response_cache_generation(self, cache_key):
+        # must be called with response_cache_lock held
+        return self.response_cache_epoch, self.response_cache_generations.setdefault(cache_key, 0)
+
+    def invalidate_cached_responses(self, device, function_ids):
+        with self.response_cache_lock:
+            for function_id in function_ids:
+                cache_key = (device.uid, function_id)
+
+                self.response_cache.pop(cache_key, None)
+                self.response_cache_generations[cache_key] = self.response_cache_generations.get(cache_key, 0) + 1
+
+    def invalidate_cached_responses_of_uid(self, uid):
+        with self.response_cache_lock:
+            for cache_key in list(self.response_cache.keys()):
+                if cache_key[0] == uid:
+                    del self.response_cache[cache_key]
+
+            # also covers keys whose response is still in flight
+            for cache_key in self.response_cache_generations:
+                if cache_key[0] == uid:
+                    self.response_cache_generations[cache_key] += 1
+
+    def check_error_code(self, response, function_id):
+        error_code = get_error_code_from_data(response)
+
+        if error_code == 0:
+            # no error
+            pass
+        elif error_code == 1:
+            msg = 'Got invalid parameter for function {0}'.format(function_id)
+            raise Error(Error.INVALID_PARAMETER, msg)
+        elif error_code == 2:
+            msg = 'Function {0} is not supported'.format(function_id)
+            raise Error(Error.NOT_SUPPORTED, msg)
         else:
-            self.send(request)
+            msg = 'Function {0} returned an unknown error'.format(function_id)
+            raise Error(Error.UNKNOWN_ERROR_CODE, msg)
+
+    def send_request_window(self, device, function_id, data_list, form, form_ret,
+                            window, retries, progress):
+        # keeps up to window requests in flight instead of waiting for each
+        # response before sending the next request. responses are matched
+        # by sequence number and can arrive in any order. a request that
+        # times out is resend up to retries times. returns the responses in
+        # the order of data_list
+        if window < 1 or window > IPConnection.MAX_REQUEST_WINDOW:
+            raise ValueError('Window has to be in [1..{0}]'.format(IPConnection.MAX_REQUEST_WINDOW))
+
+        if not device.get_response_expected(function_id):
+            raise ValueError('Response expected flag has to be enabled for function ID {0}'.format(function_id))
+
+        count = len(data_list)
+        results = [None] * count
+        done = 0
+        next_index = 0
+        pending = {} # sequence_number -> [index, attempt, deadline]
+        resend = [] # (index, attempt) of timed out requests, waiting for a sequence number
+
+        with device.request_lock:
+            # late responses that arrived before the previous call returned
+            # are still queued and would match the new sequence numbers
+            while True:
+                try:
+                    device.response_queue.get_nowait()
+                except Empty:
+                    break
+
+            # a late response could be matched to the wrong request if its
+            # sequence number was reused. sequence numbers of timed out
+            # requests are blocked until their response arrives or for
+            # another timeout, also across calls
+            stale = device.stale_window_requests
+            device.expected_response_window = set(stale.keys())
+
+            try:
+                while done < count:
+                    now = time.time()
+
+                    for key, write_off in list(stale.items()):
+                        if write_off <= now:
+                            del stale[key]
+                            device.expected_response_window.discard(key)
+
+                    # fill the window and send all new requests in one write,
+                    # timed out requests first
+                    requests = []
+
+                    while len(pending) < window and (len(resend) > 0 or next_index < count):
+                        if len(resend) > 0:
+                            index, attempt = resend[0]
+                        else:
+                            index, attempt = next_index, 0
+
+                        request, sequence_number = \
+                            self.create_window_request(device, function_id, data_list[index], form, pending, stale)
+
+                        if request is None:
+                            break # all sequence numbers are in use
+
+                        if len(resend) > 0:
+                            resend.pop(0)
+                        else:
+                            next_index += 1
+
+                        pending[sequence_number] = [index, attempt, now + self.timeout]
+                        device.expected_response_window.add((function_id, sequence_number))
+                        requests.append(request)
+
+                    if len(requests) > 0:
+                        self.send(requests[0][0:0].join(requests))
+
+                    timeout = min([p[2] for p in pending.values()] + list(stale.values())) - time.time()
+
+                    try:
+                        response = device.response_queue.get(True, max(timeout, 0))[0]
+                    except Empty:
+                        response = None
+
+                    if response is not None:
+                        sequence_number = get_sequence_number_from_data(response)
+                        key = (get_function_id_from_data(response), sequence_number)
+
+                        if key in stale:
+                            # late response of a timed out request, its
+                            # sequence number can be used again
+                            del stale[key]
+                            device.expected_response_window.discard(key)
+                            continue
+
+                        if function_id != key[0] or sequence_number not in pending:
+                            continue
+
+                        index = pending.pop(sequence_number)[0]
+                        device.expected_response_window.discard((function_id, sequence_number))
+
+                        self.check_error_code(response, function_id)
+
+                        if len(form_ret) > 0:
+                            results[index] = self.deserialize_data(response[8:], form_ret)
+
+                        done += 1
+
+                        if progress is not None:
+                            progress(done, count)
+
+                        continue
+
+                    # resend timed out requests with a new sequence number
+                    now = time.time()
+
+                    for sequence_number, p in list(pending.items()):
+                        if p[2] > now:
+                            continue
+
+                        index, attempt = p[0], p[1] + 1
+
+                        if attempt > retries:
+                            msg = 'Did not receive response for function {0} in time'.format(function_id)
+                            raise Error(Error.TIMEOUT, msg)
+
+                        del pending[sequence_number]
+                        stale[(function_id, sequence_number)] = now + self.timeout
+                        resend.append((index, attempt))
+            finally:
+                device.expected_response_window = None
+
+        return results
+
+    def create_window_request(self, device, function_id, data, form, pending, stale):
+        # returns a request with a sequence number that is neither in flight
+        # nor blocked by a timed out request, or (None, None) if there is none
+        for i in range(15):
+            request, _, sequence_number = self.create_request(device, function_id, data, form)
+
+            if sequence_number not in pending and (function_id, sequence_number) not in stale:
+                return request, sequence_number
+
+        return None, None
+
+    def send_requests(self, device, function_id, data_list, form):
+        # send requests without response in one write, this avoids a socket
+        # lock round trip and a TCP segment per request. if the response
+        # expected flag is enabled then each request has to wait for its
+        # response and is send separately
+        if device.get_response_expected(function_id):
+            for data in data_list:
+                self.send_request(device, function_id, data, form, '')
+
+            return
+
+        invalidations = device.response_cache_invalidations.get(function_id)
+
+        if invalidations is not None:
+            self.invalidate_cached_responses(device, invalidations)
+
+        requests = []
+
+        for data in data_list:
+            requests.append(self.create_request(device, function_id, data, form)[0])
+
+        if len(requests) > 0:
+            self.send(requests[0][0:0].join(requests))
+
+        # see send_request
+        if invalidations is not None:
+            self.invalidate_cached_responses(device, invalidations)
 
     def get_next_sequence_number(self):
         with self.sequence_number_lock:
@@ -1004,10 +1727,20 @@ class IPConnection:
         sequence_number = get_sequence_number_from_data(packet)
 
         if sequence_number == 0 and function_id == IPConnection.CALLBACK_ENUMERATE:
-            if IPConnection.CALLBACK_ENUMERATE in self.registered_callbacks:
-                self.callback.queue.put((IPConnection.QUEUE_PACKET, packet))
+            if len(self.response_cache_generations) > 0 and \
+               get_enumeration_type_from_data(packet) == IPConnection.ENUMERATION_TYPE_CONNECTED:
+                # the device was (re-)started, its cached configuration is invalid now
+                self.invalidate_cached_responses_of_uid(get_enumerate_uid_from_data(packet))
+
+            if IPConnection.CALLBACK_ENUMERATE in self.registered_callbacks or \
+               self.registered_listeners.has(IPConnection.CALLBACK_ENUMERATE):
+                self.callback.queue.put((IPConnection.QUEUE_PACKET, (packet, time.time())))
             return
 
+        if sequence_number == 0:
+            for tap in self.packet_taps:
+                tap(packet)
+
         uid = get_uid_from_data(packet)
 
         if not uid in self.devices:
@@ -1017,13 +1750,23 @@ class IPConnection:
         device = self.devices[uid]
 
         if sequence_number == 0:
-            if function_id in device.registered_callbacks:
-                self.callback.queue.put((IPConnection.QUEUE_PACKET, packet))
+            if function_id in device.registered_callbacks or \
+               device.registered_listeners.has(function_id):
+                self.callback.queue.put((IPConnection.QUEUE_PACKET, (packet, time.time())))
             return
 
+        # the receive time travels with the response, a device attribute would
+        # be shared by overlapping requests
         if device.expected_response_function_id == function_id and \
            device.expected_response_sequence_number == sequence_number:
-            device.response_queue.put(packet)
+            device.response_queue.put((packet, time.time()))
+            return
+
+        expected_response_window = device.expected_response_window
+
+        if expected_response_window is not None and \
+           (function_id, sequence_number) in expected_response_window:
+            device.response_queue.put((packet, time.time()))
             return
 
         # Response seems to be OK, but can't be handled
@@ -1072,6 +1815,101 @@ class IPConnection:
                                  'c B',
                                  '32B')
 
+    def split_bricklet_plugin(self, plugin):
+        plugin = list(plugin)
+        padding = -len(plugin) % IPConnection.PLUGIN_CHUNK_SIZE
+        plugin += [0] * padding
+        chunks = []
+
+        for i in range(0, len(plugin), IPConnection.PLUGIN_CHUNK_SIZE):
+            chunks.append(plugin[i:i + IPConnection.PLUGIN_CHUNK_SIZE])
+
+        if len(chunks) > IPConnection.PLUGIN_MAX_CHUNK_COUNT:
+            raise ValueError('Plugin is too big, maximum size is {0} bytes'
+                             .format(IPConnection.PLUGIN_MAX_CHUNK_COUNT * IPConnection.PLUGIN_CHUNK_SIZE))
+
+        return chunks
+
+    def write_bricklet_plugin_bulk(self, device, port, plugin, window=8, retries=3, progress=None):
+        """
+        Writes the whole *plugin* (a sequence of byte values) to the Bricklet
+        at *port* of the Brick *device*. The plugin is padded with zeros to a
+        multiple of PLUGIN_CHUNK_SIZE bytes.
+
+        Up to *window* chunk writes are kept in flight at once instead of
+        waiting for each response. A chunk that did not get a response in
+        time is resend up to *retries* times before an Error is raised. If
+        *progress* is given it is called as progress(done, total) each time
+        a chunk got written.
+        """
+
+        data_list = []
+
+        for position, chunk in enumerate(self.split_bricklet_plugin(plugin)):
+            data_list.append((port, position, chunk))
+
+        self.send_request_window(device,
+                                 IPConnection.FUNCTION_WRITE_BRICKLET_PLUGIN,
+                                 data_list,
+                                 'c B 32B',
+                                 '',
+                                 window,
+                                 retries,
+                                 progress)
+
+    def read_bricklet_plugin_bulk(self, device, port, length, window=8, retries=3, progress=None):
+        """
+        Reads the first *length* bytes of the plugin from the Bricklet at
+        *port* of the Brick *device* and returns them as list. The *window*,
+        *retries* and *progress* parameters work as for
+        write_bricklet_plugin_bulk.
+        """
+
+        chunk_count = (length + IPConnection.PLUGIN_CHUNK_SIZE - 1) // IPConnection.PLUGIN_CHUNK_SIZE
+
+        if chunk_count > IPConnection.PLUGIN_MAX_CHUNK_COUNT:
+            raise ValueError('Length is too big, maximum length is {0} bytes'
+                             .format(IPConnection.PLUGIN_MAX_CHUNK_COUNT * IPConnection.PLUGIN_CHUNK_SIZE))
+
+        data_list = []
+
+        for position in range(chunk_count):
+            data_list.append((port, position))
+
+        chunks = self.send_request_window(device,
+                                          IPConnection.FUNCTION_READ_BRICKLET_PLUGIN,
+                                          data_list,
+                                          'c B',
+                                          '32B',
+                                          window,
+                                          retries,
+                                          progress)
+        plugin = []
+
+        for chunk in chunks:
+            plugin += list(chunk)
+
+        return plugin[:length]
+
+    def verify_bricklet_plugin(self, device, port, plugin, window=8, retries=3, progress=None):
+        """
+        Reads back the plugin from the Bricklet at *port* of the Brick
+        *device* and compares it with *plugin* (padded as by
+        write_bricklet_plugin_bulk). Returns *true* if they match, *false*
+        otherwise. The *window*, *retries* and *progress* parameters work as
+        for write_bricklet_plugin_bulk.
+        """
+
+        expected = []
+
+        for chunk in self.split_bricklet_plugin(plugin):
+            expected += chunk
+
+        # the protocol has no checksum for the plugin on the Bricklet, the
+        # plugin has to be read back completely anyway
+        return self.read_bricklet_plugin_bulk(device, port, len(expected),
+                                              window, retries, progress) == expected
+
     def get_adc_calibration(self, device):
         return self.send_request(device,
                                  IPConnection.FUNCTION_GET_ADC_CALIBRATION,
@@ -1103,3 +1941,101 @@ class IPConnection:
                                     'I')
 
         return base58encode(uid_int)
+
+def enumerate_endpoints(endpoints, secret=None, max_connections=16, deadline=2.5,
+                        idle_timeout=0.25, callback=None):
+    """
+    Enumerates the devices behind many endpoints concurrently. *endpoints* is
+    a list of (host, port) tuples. At most *max_connections* endpoints are
+    connected at the same time. An endpoint is disconnected as soon as it
+    did not send an enumerate callback for *idle_timeout* seconds, but at the
+    latest *deadline* seconds after connecting to it was started.
+
+    Devices are deduplicated by UID, the first endpoint reporting a device
+    wins. *callback* is called with the EndpointEnumeration of each new device
+    as it arrives, calls are serialized.
+
+    Returns a dict from UID to EndpointEnumeration and a dict from (host, port)
+    to the exception that aborted the enumeration of that endpoint.
+    """
+
+    pending = Queue()
+    topology = {} # protected by lock
+    errors = {} # protected by lock
+    lock = Lock()
+
+    for endpoint in endpoints:
+        pending.put(tuple(endpoint))
+
+    def enumerate_endpoint(host, port):
+        start = time.time()
+        last_activity = [start]
+
+        def handle_enumerate(uid, connected_uid, position, hardware_version,
+                             firmware_version, device_identifier, enumeration_type):
+            last_activity[0] = time.time()
+
+            if enumeration_type == IPConnection.ENUMERATION_TYPE_DISCONNECTED:
+                return
+
+            entry = EndpointEnumeration(host, port, uid, connected_uid, position,
+                                        hardware_version, firmware_version,
+                                        device_identifier, enumeration_type)
+
+            with lock:
+                if uid in topology:
+                    return
+
+                topology[uid] = entry
+
+                if callback is not None:
+                    callback(entry)
+
+        ipcon = IPConnection()
+        ipcon.connect_timeout = deadline
+        ipcon.set_timeout(deadline)
+        ipcon.register_callback(IPConnection.CALLBACK_ENUMERATE, handle_enumerate)
+        ipcon.connect(host, port)
+
+        try:
+            if secret is not None:
+                ipcon.authenticate(secret)
+
+            last_activity[0] = time.time()
+            ipcon.enumerate()
+
+            while True:
+                remaining = min(start + deadline, last_activity[0] + idle_timeout) - time.time()
+
+                if remaining <= 0:
+                    break
+
+                time.sleep(remaining)
+        finally:
+            ipcon.disconnect()
+
+    def worker_loop():
+        while True:
+            try:
+                host, port = pending.get(False)
+            except Empty:
+                return
+
+            try:
+                enumerate_endpoint(host, port)
+            except (Error, socket.error):
+                with lock:
+                    errors[(host, port)] = sys.exc_info()[1]
+
+    workers = []
+
+    for i in range(max(1, min(max_connections, pending.qsize()))):
+        worker = Thread(name='Enumerate-Worker', target=worker_loop)
+        worker.daemon = True
+        worker.start()
+        workers.append(worker)
+
+    for worker in workers:
+        worker.join()
+
+    return topology, errors
@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 agent <agent@local>
+#
+# Redistribution and use in source and binary forms of this file,
+# with or without modification, are permitted. See the Creative
+# Commons Zero (CC0 1.0) License for more details.
+
+from threading import Lock
+
+try:
+    from .ip_connection import IPConnection, Error, base58decode, uid64_to_uid32
+except (ValueError, ImportError):
+    from ip_connection import IPConnection, Error, base58decode, uid64_to_uid32
+
+def uid_to_uid32(uid):
+    uid_ = base58decode(uid)
+
+    if uid_ > 0xFFFFFFFF:
+        uid_ = uid64_to_uid32(uid_)
+
+    return uid_
+
+class PoolDevices(dict):
+    # Device.__init__ adds a device with ipcon.devices[uid] = device. a device
+    # with a known route is also added to the IP Connection of its endpoint
+    # right away, so its callbacks are received before its first request
+    def __init__(self, pool):
+        dict.__init__(self)
+
+        self.pool = pool
+
+    def __setitem__(self, uid, device):
+        dict.__setitem__(self, uid, device)
+
+        self.pool.attach_device(uid, device)
+
+class IPConnectionPool:
+    CALLBACK_ENUMERATE = IPConnection.CALLBACK_ENUMERATE
+    CALLBACK_CONNECTED = IPConnection.CALLBACK_CONNECTED
+    CALLBACK_DISCONNECTED = IPConnection.CALLBACK_DISCONNECTED
+
+    def __init__(self):
+        """
+        Creates a pool of IP Connections to several Brick Daemons or
+        WIFI/Ethernet Extensions. The pool can be used instead of an IP
+        Connection for the constructor of Bricks and Bricklets. Requests
+        are routed to the endpoint that the device was last enumerated on.
+        Requests to devices on different endpoints run in parallel.
+        """
+
+        self.connections = {} # (host, port) -> IPConnection, protected by lock
+        self.routes = {} # uid -> (host, port), protected by lock
+        self.devices = PoolDevices(self)
+        self.registered_callbacks = {}
+        self.timeout = 2.5
+        self.lock = Lock()
+
+    def connect(self, host, port, secret=None):
+        """
+        Adds an endpoint to the pool. Creates an IP Connection to the given
+        *host* and *port*, authenticates with *secret* if given and starts
+        an enumerate to learn which devices are reachable through it.
+        """
+
+        endpoint = (host, port)
+
+        with self.lock:
+            if endpoint in self.connections:
+                raise Error(Error.ALREADY_CONNECTED,
+                            'Already connected to {0}:{1}'.format(host, port))
+
+        ipcon = IPConnection()
+        ipcon.set_timeout(self.timeout)
+
+        def handle_enumerate(*args):
+            self.handle_enumerate(endpoint, *args)
+
+        def handle_connected(connect_reason):
+            # devices might have moved while the endpoint was unreachable
+            if connect_reason == IPConnection.CONNECT_REASON_AUTO_RECONNECT:
+                ipcon.enumerate()
+
+            self.dispatch(IPConnectionPool.CALLBACK_CONNECTED, host, port, connect_reason)
+
+        def handle_disconnected(disconnect_reason):
+            self.dispatch(IPConnectionPool.CALLBACK_DISCONNECTED, host, port, disconnect_reason)
+
+        ipcon.register_callback(IPConnection.CALLBACK_ENUMERATE, handle_enumerate)
+        ipcon.register_callback(IPConnection.CALLBACK_CONNECTED, handle_connected)
+        ipcon.register_callback(IPConnection.CALLBACK_DISCONNECTED, handle_disconnected)
+        ipcon.connect(host, port)
+
+        try:
+            if secret is not None:
+                ipcon.authenticate(secret)
+
+            with self.lock:
+                if endpoint in self.connections:
+                    raise Error(Error.ALREADY_CONNECTED,
+                                'Already connected to {0}:{1}'.format(host, port))
+
+                self.connections[endpoint] = ipcon
+
+                # routes can be set before their endpoint is connected
+                for uid, route in self.routes.items():
+                    if route == endpoint and uid in self.devices:
+                        ipcon.devices[uid] = self.devices[uid]
+
+            ipcon.enumerate()
+        except:
+            ipcon.disconnect()
+            raise
+
+    def disconnect(self, host=None, port=None):
+        """
+        Removes the endpoint given by *host* and *port* from the pool and
+        disconnects it. Without parameters all endpoints are removed.
+        """
+
+        with self.lock:
+            if host is None and port is None:
+                endpoints = list(self.connections.keys())
+            elif (host, port) in self.connections:
+                endpoints = [(host, port)]
+            else:
+                raise Error(Error.NOT_CONNECTED, 'Not connected to {0}:{1}'.format(host, port))
+
+            connections = []
+
+            for endpoint in endpoints:
+                connections.append(self.connections.pop(endpoint))
+
+                for uid, route in list(self.routes.items()):
+                    if route == endpoint:
+                        del self.routes[uid]
+
+        for ipcon in connections:
+            try:
+                ipcon.disconnect()
+            except Error:
+                pass
+
+    def enumerate(self):
+        """
+        Broadcasts an enumerate request on all endpoints. All devices will
+        respond with an enumerate callback and update the routing.
+        """
+
+        with self.lock:
+            connections = list(self.connections.values())
+
+        for ipcon in connections:
+            try:
+                ipcon.enumerate()
+            except Error:
+                pass # endpoint is currently reconnecting
+
+    def set_timeout(self, timeout):
+        """
+        Sets the timeout in seconds for getters and for setters for which the
+        response expected flag is activated on all endpoints.
+
+        Default timeout is 2.5.
+        """
+
+        timeout = float(timeout)
+
+        if timeout < 0:
+            raise ValueError('Timeout cannot be negative')
+
+        self.timeout = timeout
+
+        with self.lock:
+            for ipcon in self.connections.values():
+                ipcon.set_timeout(timeout)
+
+    def get_timeout(self):
+        """
+        Returns the timeout as set by set_timeout.
+        """
+
+        return self.timeout
+
+    def register_callback(self, id, callback):
+        """
+        Registers a callback with ID *id* to the function *callback*.
+
+        CALLBACK_ENUMERATE gets the same arguments as for an IP Connection.
+        CALLBACK_CONNECTED and CALLBACK_DISCONNECTED get the host and port of
+        the endpoint in addition to the reason.
+        """
+
+        self.registered_callbacks[id] = callback
+
+    def set_route(self, uid, host, port):
+        """
+        Routes requests for the device with UID *uid* to the endpoint given
+        by *host* and *port* until it is enumerated on another endpoint.
+        """
+
+        self.update_route(uid_to_uid32(uid), (host, port))
+
+    def get_route(self, uid):
+        """
+        Returns the (host, port) tuple of the endpoint that requests for the
+        device with UID *uid* are routed to, or *None* if it is unknown.
+        """
+
+        with self.lock:
+            return self.routes.get(uid_to_uid32(uid))
+
+    def get_connection(self, device):
+        """
+        Returns the IP Connection that requests for *device* are routed to.
+        """
+
+        with self.lock:
+            try:
+                ipcon = self.connections[self.routes[device.uid]]
+            except KeyError:
+                raise Error(Error.NOT_CONNECTED, 'No endpoint known for device {0}'.format(device.uid))
+
+            if ipcon.devices.get(device.uid) is not device:
+                ipcon.devices[device.uid] = device
+
+            return ipcon
+
+    def send_request(self, device, function_id, data, form, form_ret):
+        return self.get_connection(device).send_request(device, function_id, data, form, form_ret)
+
+    def send_requests(self, device, function_id, data_list, form):
+        self.get_connection(device).send_requests(device, function_id, data_list, form)
+
+    def invalidate_cached_responses(self, device, function_ids):
+        with self.lock:
+            connections = list(self.connections.values())
+
+        for ipcon in connections:
+            ipcon.invalidate_cached_responses(device, function_ids)
+
+    def attach_device(self, uid, device):
+        with self.lock:
+            endpoint = self.routes.get(uid)
+
+            if endpoint in self.connections:
+                self.connections[endpoint].devices[uid] = device
+
+    def update_route(self, uid, endpoint):
+        with self.lock:
+            old_endpoint = self.routes.get(uid)
+
+            if old_endpoint == endpoint:
+                return
+
+            self.routes[uid] = endpoint
+            device = self.devices.get(uid)
+
+            if device is None:
+                return
+
+            # move device to the IP Connection of the new endpoint, so that
+            # responses and callbacks are received from there
+            if old_endpoint in self.connections:
+                old_devices = self.connections[old_endpoint].devices
+
+                if old_devices.get(uid) is device:
+                    del old_devices[uid]
+
+            if endpoint in self.connections:
+                self.connections[endpoint].devices[uid] = device
+
+    def remove_route(self, uid, endpoint):
+        with self.lock:
+            if self.routes.get(uid) != endpoint:
+                return
+
+            del self.routes[uid]
+
+            if endpoint in self.connections:
+                devices = self.connections[endpoint].devices
+
+                if uid in devices and devices[uid] is self.devices.get(uid):
+                    del devices[uid]
+
+    def handle_enumerate(self, endpoint, uid, connected_uid, position, hardware_version,
+                         firmware_version, device_identifier, enumeration_type):
+        uid32 = uid_to_uid32(uid)
+
+        if enumeration_type == IPConnection.ENUMERATION_TYPE_DISCONNECTED:
+            self.remove_route(uid32, endpoint)
+        else:
+            self.update_route(uid32, endpoint)
+
+        self.dispatch(IPConnectionPool.CALLBACK_ENUMERATE, uid, connected_uid, position,
+                      hardware_version, firmware_version, device_identifier,
+                      enumeration_type)
+
+    def dispatch(self, id, *args):
+        callback = self.registered_callbacks.get(id)
+
+        if callback is not None:
+            callback(*args)
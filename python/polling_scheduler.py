@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 agent <agent@local>
+#
+# Redistribution and use in source and binary forms of this file,
+# with or without modification, are permitted. See the Creative
+# Commons Zero (CC0 1.0) License for more details.
+
+from threading import Thread, Lock, Condition
+
+# Queue for python 2, queue for python 3
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+import time
+import heapq
+import random
+
+try:
+    from .ip_connection import namedtuple
+except (ValueError, ImportError):
+    from ip_connection import namedtuple
+
+# time.monotonic for python 3.3 and newer, fall back to time.time before
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    monotonic = time.time
+
+PollResult = namedtuple('PollResult', ['token', 'device', 'getter', 'timestamp', 'value', 'error'])
+PollingStatistics = namedtuple('PollingStatistics', ['requests', 'missed_deadlines', 'errors', 'slowdown'])
+
+class PollingEntry:
+    def __init__(self, token, device, getter, name, interval, args):
+        self.token = token
+        self.device = device
+        self.getter = getter
+        self.name = name
+        self.interval = interval
+        self.args = args
+        self.deadline = None # without jitter, to stay drift-free
+        self.busy = False # queued or in flight, protected by scheduler lock
+        self.removed = False # protected by scheduler lock
+
+class ConnectionWorkers:
+    def __init__(self, scheduler, max_in_flight):
+        self.scheduler = scheduler
+        self.max_in_flight = max_in_flight
+        self.queue = Queue()
+        self.slowdown = 1.0 # protected by scheduler lock
+        self.threads = []
+
+    def start(self):
+        for i in range(self.max_in_flight):
+            thread = Thread(name='Polling-Worker', target=self.scheduler.worker_loop, args=(self,))
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        for thread in self.threads:
+            self.queue.put(None)
+
+        for thread in self.threads:
+            thread.join()
+
+        self.threads = []
+
+class PollingScheduler:
+    MAX_SLOWDOWN = 8.0
+
+    def __init__(self, callback, max_in_flight=4, batch_interval=0.1, jitter=0.05):
+        """
+        Creates a scheduler that polls getters periodically and calls
+        *callback* every *batch_interval* seconds with a list of PollResult
+        tuples for the getter calls finished since the last batch.
+
+        At most *max_in_flight* requests per IP Connection are in flight at
+        the same time, requests to different devices are pipelined. Each
+        request is delayed by up to *jitter* times its interval to avoid
+        bursts.
+
+        The error of a PollResult is the exception raised by the getter,
+        usually an Error.
+
+        If a getter is still queued or in flight when its next deadline is
+        reached, the call is skipped and counted as missed deadline. Missed
+        deadlines slow down all intervals of that IP Connection, on-time
+        calls speed them up again, up to the registered intervals.
+        """
+
+        self.callback = callback
+        self.max_in_flight = max_in_flight
+        self.batch_interval = batch_interval
+        self.jitter = jitter
+        self.entries = [] # heap of (due time, token, entry), protected by lock
+        # keyed by the ipcon object, its id could be reused after it was garbage collected
+        self.connections = {} # ipcon -> ConnectionWorkers, protected by lock
+        self.results = [] # protected by lock
+        self.next_token = 1 # protected by lock
+        self.requests = 0 # protected by lock
+        self.missed_deadlines = 0 # protected by lock
+        self.errors = 0 # protected by lock
+        self.running = False # protected by lock
+        self.lock = Lock()
+        self.condition = Condition(self.lock)
+        self.thread = None
+
+    def add(self, device, getter, interval, args=()):
+        """
+        Polls *getter* of *device* every *interval* seconds with the given
+        *args*. *getter* is either the name of a getter function, such as
+        'get_temperature', or a bound getter function of *device*. The first
+        call is placed randomly within the first interval, to spread the
+        requests over time.
+
+        Returns a token for remove.
+        """
+
+        if interval <= 0:
+            raise ValueError('Interval has to be positive')
+
+        if isinstance(getter, str):
+            name = getter
+            getter = getattr(device, name)
+        else:
+            name = getter.__name__
+
+        with self.lock:
+            token = self.next_token
+            self.next_token += 1
+            entry = PollingEntry(token, device, getter, name, interval, tuple(args))
+            entry.deadline = monotonic() + random.uniform(0, interval)
+
+            if device.ipcon not in self.connections:
+                workers = ConnectionWorkers(self, self.max_in_flight)
+                self.connections[device.ipcon] = workers
+
+                if self.running:
+                    workers.start()
+
+            heapq.heappush(self.entries, (entry.deadline, token, entry))
+            self.condition.notify()
+
+        return token
+
+    def remove(self, token):
+        """
+        Stops polling the getter that was added with the returned *token*.
+        The worker threads of an IP Connection are stopped after its last
+        getter was removed.
+        """
+
+        workers = None
+
+        with self.lock:
+            for due, entry_token, entry in self.entries:
+                if entry_token == token and not entry.removed:
+                    break
+            else:
+                raise ValueError('Invalid polling token {0}'.format(token))
+
+            entry.removed = True
+            ipcon = entry.device.ipcon
+
+            if not any(other.device.ipcon is ipcon and not other.removed for _, _, other in self.entries):
+                workers = self.connections.pop(ipcon)
+
+        # outside the lock, the workers need it to finish their requests
+        if workers is not None:
+            workers.stop()
+
+    def start(self):
+        """
+        Starts polling in a background thread.
+        """
+
+        with self.lock:
+            if self.running:
+                return
+
+            self.running = True
+
+            for workers in self.connections.values():
+                workers.start()
+
+        self.thread = Thread(name='Polling-Scheduler', target=self.schedule_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stops polling and delivers the last batch. Requests in flight are
+        finished but not delivered anymore.
+        """
+
+        with self.lock:
+            if not self.running:
+                return
+
+            self.running = False
+            self.condition.notify()
+
+        self.thread.join()
+        self.thread = None
+
+        with self.lock:
+            connections = list(self.connections.values())
+
+        for workers in connections:
+            workers.stop()
+
+        # entries that were still queued are due again after a restart
+        with self.lock:
+            for due, token, entry in self.entries:
+                entry.busy = False
+
+    def get_statistics(self):
+        """
+        Returns the number of getter calls, the number of missed deadlines,
+        the number of failed getter calls and the largest current slowdown
+        factor of all IP Connections.
+        """
+
+        with self.lock:
+            slowdown = 1.0
+
+            for workers in self.connections.values():
+                slowdown = max(slowdown, workers.slowdown)
+
+            return PollingStatistics(self.requests, self.missed_deadlines, self.errors, slowdown)
+
+    def schedule_loop(self):
+        next_batch = monotonic() + self.batch_interval
+
+        while True:
+            batch = None
+
+            with self.lock:
+                if not self.running:
+                    batch = self.results
+                    self.results = []
+                    break
+
+                now = monotonic()
+
+                while len(self.entries) > 0 and self.entries[0][0] <= now:
+                    due, token, entry = heapq.heappop(self.entries)
+
+                    if entry.removed:
+                        continue
+
+                    workers = self.connections[entry.device.ipcon]
+
+                    if entry.busy:
+                        self.missed_deadlines += 1
+                        workers.slowdown = min(workers.slowdown * 1.25, PollingScheduler.MAX_SLOWDOWN)
+                    else:
+                        entry.busy = True
+                        workers.queue.put(entry)
+
+                    # drift-free, the next deadline doesn't depend on when
+                    # this one was served. the jitter spreads requests that
+                    # got due at the same time. it is part of the due time,
+                    # so a jittered request doesn't hold up the queue
+                    entry.deadline += entry.interval * workers.slowdown
+                    due = entry.deadline + random.uniform(0, self.jitter * entry.interval)
+                    heapq.heappush(self.entries, (due, token, entry))
+
+                if now >= next_batch:
+                    batch = self.results
+                    self.results = []
+                    next_batch = now + self.batch_interval
+
+                if batch is None:
+                    timeout = next_batch - now
+
+                    if len(self.entries) > 0:
+                        timeout = min(timeout, self.entries[0][0] - now)
+
+                    self.condition.wait(max(timeout, 0))
+
+            if batch is not None and len(batch) > 0:
+                self.callback(batch)
+
+        if len(batch) > 0:
+            self.callback(batch)
+
+    def worker_loop(self, workers):
+        while True:
+            entry = workers.queue.get()
+
+            if entry is None:
+                return
+
+            if not self.running:
+                continue # drain the queue on stop
+
+            value = None
+            error = None
+
+            try:
+                value = entry.getter(*entry.args)
+            except Exception as e:
+                # besides Error a getter can raise anything, e.g. socket.error
+                # or a TypeError of a user function. it is delivered as error
+                # instead of killing this worker
+                error = e
+            finally:
+                # the entry has to become due again in any case, otherwise
+                # all its deadlines are missed from now on
+                timestamp = time.time()
+
+                with self.lock:
+                    entry.busy = False
+                    self.requests += 1
+
+                    if error is not None:
+                        self.errors += 1
+                    else:
+                        workers.slowdown = max(1.0, workers.slowdown * 0.98)
+
+                    if self.running and not entry.removed:
+                        self.results.append(PollResult(entry.token, entry.device, entry.name,
+                                                       timestamp, value, error))
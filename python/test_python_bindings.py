@@ -30,6 +30,7 @@ import shutil
 
 sys.path.append(os.path.split(os.getcwd())[0])
 import common
+import test_python_runtime
 
 class PythonExamplesTester(common.ExamplesTester):
     def __init__(self, path, python, extra_examples):
@@ -74,7 +75,12 @@ def run(path):
     if not success:
         return success
 
-    return PythonExamplesTester(path, 'python3', extra_examples).run()
+    success = PythonExamplesTester(path, 'python3', extra_examples).run()
+
+    if not success:
+        return success
+
+    return test_python_runtime.run(path)
 
 if __name__ == "__main__":
     sys.exit(run(os.getcwd()))
@@ -0,0 +1,1699 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Python Runtime Tester
+Copyright (C) 2026 agent <agent@local>
+
+test_python_runtime.py: Tests the Python bindings against a fake Brick Daemon
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this program; if not, write to the
+Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+Boston, MA 02111-1307, USA.
+"""
+
+import sys
+import os
+import subprocess
+import shutil
+import struct
+import socket
+import hmac
+import hashlib
+import json
+import math
+import time
+import array
+import tempfile
+import threading
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# time.monotonic for python 3.3 and newer, fall back to time.time before
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    monotonic = time.time
+
+# set by main() after the bindings were found
+IPConnection = None
+Error = None
+BrickletTemperature = None
+BrickletLEDStrip = None
+BrickMaster = None
+base58encode = None
+PollingScheduler = None
+CallbackPipeline = None
+CallbackTrace = None
+callback_ring = None
+TopologyCache = None
+IPConnectionPool = None
+enumerate_endpoints = None
+BrickProxy = None
+CallbackRecorder = None
+CallbackRecordingReader = None
+
+BRICK_DAEMON_UID = 1
+FUNCTION_GET_AUTHENTICATION_NONCE = 1
+FUNCTION_AUTHENTICATE = 2
+FUNCTION_DISCONNECT_PROBE = 128
+FUNCTION_ENUMERATE = 254
+CALLBACK_ENUMERATE = 253
+FUNCTION_GET_IDENTITY = 255
+ERROR_CODE_FUNCTION_NOT_SUPPORTED = 2
+
+FIRST_DEVICE_UID = 1000
+WORKER_COUNT = 16 # more than the request window of one IP Connection
+GETTER_COUNT = 250 # per worker
+SETTER_COUNT = 100 # per worker
+CALLBACK_PERIOD = 5 # ms
+CALLBACK_DURATION = 0.5 # seconds
+LED_COUNT = 40 # three set_rgb_values requests
+
+# latency budgets in seconds for loopback. a loaded or virtualized machine can
+# stall for longer than that, so they are only checked if the environment
+# variable TF_CHECK_LATENCY_BUDGETS is set to 1
+CHECK_LATENCY_BUDGETS = os.environ.get('TF_CHECK_LATENCY_BUDGETS') == '1'
+P99_GETTER_LATENCY_BUDGET = 0.025
+P99_SHARED_GETTER_LATENCY_BUDGET = 0.1 # requests of all workers queue up at one device
+P99_CALLBACK_LATENCY_BUDGET = 0.025
+RECONNECT_BUDGET = 1.0
+WAIT_TIMEOUT = 5.0
+
+def get_percentile(values, percentile):
+    values = sorted(values)
+
+    return values[max(0, int(math.ceil(percentile / 100.0 * len(values))) - 1)]
+
+def wait_until(condition):
+    # polls condition until it is true, but at most for WAIT_TIMEOUT
+    deadline = monotonic() + WAIT_TIMEOUT
+
+    while not condition() and monotonic() < deadline:
+        time.sleep(0.01)
+
+    return condition()
+
+def run_workers(target, count):
+    # runs target(index) in count threads at the same time and reraises the
+    # first failure in the calling thread
+    failures = []
+    barrier = threading.Event()
+
+    def loop(index):
+        barrier.wait()
+
+        try:
+            target(index)
+        except BaseException:
+            failures.append(sys.exc_info())
+
+    threads = []
+
+    for i in range(count):
+        thread = threading.Thread(name='Test-Worker-{0}'.format(i), target=loop, args=(i,))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+
+    barrier.set()
+
+    for thread in threads:
+        thread.join()
+
+    if len(failures) > 0:
+        exc_type, exc_value, exc_traceback = failures[0]
+        raise exc_value
+
+class FakeTemperatureBricklet:
+    def __init__(self, uid):
+        self.uid = uid
+        self.device_identifier = BrickletTemperature.DEVICE_IDENTIFIER
+        self.temperature = uid % 10000
+        self.callback_period = 0
+        self.debounce_period = 100
+        self.debounce_requested = threading.Event()
+        self.debounce_gate = None # holds back the get_debounce_period response until set
+
+class FakeMasterBrick:
+    def __init__(self, uid):
+        self.uid = uid
+        self.device_identifier = BrickMaster.DEVICE_IDENTIFIER
+        self.plugin = {} # position -> chunk
+        self.faults = {} # (function_id, position) -> response delay in seconds, None drops it, used once
+
+class FakeLEDStripBricklet:
+    def __init__(self, uid, led_count):
+        self.uid = uid
+        self.device_identifier = BrickletLEDStrip.DEVICE_IDENTIFIER
+        self.r = [0] * led_count
+        self.g = [0] * led_count
+        self.b = [0] * led_count
+        self.render_frames = True # sends the FrameRendered callback once the last LED was set
+
+class FakeClient:
+    def __init__(self, socket):
+        self.socket = socket
+        self.send_lock = threading.Lock()
+        self.authenticated = False
+        self.server_nonce = None
+        self.closed = False
+
+    def send(self, packet):
+        with self.send_lock:
+            if self.closed:
+                return
+
+            try:
+                self.socket.sendall(packet)
+            except socket.error:
+                self.closed = True
+
+class FakeBrickDaemon:
+    def __init__(self, secret=None):
+        """
+        Starts a Brick Daemon stand-in on a free loopback port that answers
+        the requests of Temperature Bricklets added with add_device. If a
+        *secret* is given, clients have to authenticate first, requests of
+        unauthenticated clients are dropped like brickd does.
+        """
+
+        self.secret = secret
+        self.devices = {} # uid -> FakeTemperatureBricklet, protected by lock
+        self.clients = [] # protected by lock
+        self.callback_send_times = {} # (uid, value) -> monotonic send time, protected by lock
+        self.next_nonce = 1 # protected by lock
+        self.lock = threading.Lock()
+        self.running = True
+
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind(('127.0.0.1', 0))
+        self.server_socket.listen(16)
+        self.port = self.server_socket.getsockname()[1]
+
+        thread = threading.Thread(name='Fake-Brickd-Accept', target=self.accept_loop)
+        thread.daemon = True
+        thread.start()
+
+    def add_device(self, uid):
+        with self.lock:
+            device = FakeTemperatureBricklet(uid)
+            self.devices[uid] = device
+
+        return device
+
+    def add_led_strip(self, uid, led_count):
+        with self.lock:
+            device = FakeLEDStripBricklet(uid, led_count)
+            self.devices[uid] = device
+
+        return device
+
+    def add_master(self, uid):
+        with self.lock:
+            device = FakeMasterBrick(uid)
+            self.devices[uid] = device
+
+        return device
+
+    def get_client_count(self):
+        with self.lock:
+            return len(self.clients)
+
+    def drop_clients(self):
+        """
+        Closes all client connections, as if brickd was restarted.
+        """
+
+        with self.lock:
+            clients = self.clients
+            self.clients = []
+
+        for client in clients:
+            self.close_client(client)
+
+    def close(self):
+        self.running = False
+
+        try:
+            self.server_socket.close()
+        except socket.error:
+            pass
+
+        self.drop_clients()
+
+    def close_client(self, client):
+        with client.send_lock:
+            client.closed = True
+
+        try:
+            client.socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+        client.socket.close()
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                client_socket, address = self.server_socket.accept()
+            except socket.error:
+                return
+
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = FakeClient(client_socket)
+
+            with self.lock:
+                self.clients.append(client)
+
+            thread = threading.Thread(name='Fake-Brickd-Client', target=self.client_loop, args=(client,))
+            thread.daemon = True
+            thread.start()
+
+    def client_loop(self, client):
+        pending = b''
+
+        while not client.closed:
+            try:
+                data = client.socket.recv(8192)
+            except socket.error:
+                data = b''
+
+            if len(data) == 0:
+                break
+
+            pending += data
+
+            while len(pending) >= 8:
+                length = struct.unpack('<B', pending[4:5])[0]
+
+                if len(pending) < length:
+                    break
+
+                self.handle_request(client, pending[:length])
+                pending = pending[length:]
+
+        with self.lock:
+            if client in self.clients:
+                self.clients.remove(client)
+
+        with client.send_lock:
+            client.closed = True
+
+    def send_response(self, client, request, payload=b'', error_code=0):
+        uid, length, function_id, sequence_number_and_options, flags = struct.unpack('<IBBBB', request[:8])
+
+        client.send(struct.pack('<IBBBB', uid, 8 + len(payload), function_id,
+                                sequence_number_and_options, error_code << 6) + payload)
+
+    def send_callback(self, client, uid, function_id, payload):
+        client.send(struct.pack('<IBBBB', uid, 8 + len(payload), function_id, 0, 0) + payload)
+
+    def handle_request(self, client, request):
+        uid, length, function_id, sequence_number_and_options, flags = struct.unpack('<IBBBB', request[:8])
+        response_expected = (sequence_number_and_options >> 3) & 0x01
+        payload = request[8:]
+
+        if function_id == FUNCTION_DISCONNECT_PROBE:
+            return
+
+        if uid == BRICK_DAEMON_UID:
+            self.handle_brick_daemon_request(client, request, function_id, payload)
+            return
+
+        if self.secret is not None and not client.authenticated:
+            return
+
+        if function_id == FUNCTION_ENUMERATE:
+            with self.lock:
+                devices = list(self.devices.values())
+
+            for device in devices:
+                self.send_callback(client, 0, CALLBACK_ENUMERATE,
+                                   struct.pack('<8s8sc3B3BHB', base58encode(device.uid).encode('ascii'),
+                                               b'0', b'a', 1, 1, 0, 2, 0, 1, device.device_identifier,
+                                               IPConnection.ENUMERATION_TYPE_AVAILABLE))
+
+            return
+
+        with self.lock:
+            device = self.devices.get(uid)
+
+        if device is None:
+            return # brickd doesn't answer for unknown devices, the request times out
+
+        if function_id == FUNCTION_GET_IDENTITY:
+            response = struct.pack('<8s8sc3B3BH', base58encode(device.uid).encode('ascii'), b'0', b'a',
+                                   1, 1, 0, 2, 0, 1, device.device_identifier)
+        elif isinstance(device, FakeLEDStripBricklet):
+            response = self.handle_led_strip_request(device, function_id, payload)
+        elif isinstance(device, FakeMasterBrick):
+            response = self.handle_master_request(device, function_id, payload)
+            key = (function_id, struct.unpack('<B', payload[1:2])[0])
+
+            with self.lock:
+                faulty = key in device.faults
+                delay = device.faults.pop(key, None)
+
+            if faulty:
+                if delay is not None:
+                    timer = threading.Timer(delay, self.send_response, args=(client, request, response))
+                    timer.daemon = True
+                    timer.start()
+
+                return
+        else:
+            response = self.handle_temperature_request(device, function_id, payload)
+
+        if response is None:
+            if response_expected:
+                self.send_response(client, request, error_code=ERROR_CODE_FUNCTION_NOT_SUPPORTED)
+        elif response_expected:
+            self.send_response(client, request, response)
+
+    def handle_temperature_request(self, device, function_id, payload):
+        response = b''
+
+        if function_id == BrickletTemperature.FUNCTION_GET_TEMPERATURE:
+            response = struct.pack('<h', device.temperature)
+        elif function_id == BrickletTemperature.FUNCTION_SET_TEMPERATURE_CALLBACK_PERIOD:
+            device.callback_period = struct.unpack('<I', payload)[0]
+
+            if device.callback_period > 0:
+                thread = threading.Thread(name='Fake-Brickd-Callback', target=self.callback_loop,
+                                          args=(device, device.callback_period))
+                thread.daemon = True
+                thread.start()
+        elif function_id == BrickletTemperature.FUNCTION_GET_TEMPERATURE_CALLBACK_PERIOD:
+            response = struct.pack('<I', device.callback_period)
+        elif function_id == BrickletTemperature.FUNCTION_SET_DEBOUNCE_PERIOD:
+            device.debounce_period = struct.unpack('<I', payload)[0]
+        elif function_id == BrickletTemperature.FUNCTION_GET_DEBOUNCE_PERIOD:
+            response = struct.pack('<I', device.debounce_period)
+            gate = device.debounce_gate
+
+            if gate is not None:
+                device.debounce_requested.set()
+                gate.wait()
+        else:
+            response = None
+
+        return response
+
+    def handle_led_strip_request(self, device, function_id, payload):
+        if function_id == BrickletLEDStrip.FUNCTION_SET_RGB_VALUES:
+            values = struct.unpack('<HB16B16B16B', payload)
+            index, length = values[0:2]
+
+            for i in range(length):
+                device.r[index + i] = values[2 + i]
+                device.g[index + i] = values[18 + i]
+                device.b[index + i] = values[34 + i]
+
+            # the real Bricklet renders with a fixed frame duration instead
+            if index + length == len(device.r) and device.render_frames:
+                self.broadcast_callback(device.uid, BrickletLEDStrip.CALLBACK_FRAME_RENDERED,
+                                        struct.pack('<H', len(device.r)))
+
+            return b''
+        elif function_id == BrickletLEDStrip.FUNCTION_GET_RGB_VALUES:
+            index, length = struct.unpack('<HB', payload)
+            padding = [0] * (16 - length)
+
+            return struct.pack('<16B16B16B', *(device.r[index:index + length] + padding +
+                                               device.g[index:index + length] + padding +
+                                               device.b[index:index + length] + padding))
+
+        return None
+
+    def handle_master_request(self, device, function_id, payload):
+        if function_id == IPConnection.FUNCTION_WRITE_BRICKLET_PLUGIN:
+            device.plugin[struct.unpack('<B', payload[1:2])[0]] = payload[2:34]
+
+            return b''
+        elif function_id == IPConnection.FUNCTION_READ_BRICKLET_PLUGIN:
+            return device.plugin.get(struct.unpack('<B', payload[1:2])[0], b'\0' * 32)
+
+        return None
+
+    def handle_brick_daemon_request(self, client, request, function_id, payload):
+        if function_id == FUNCTION_GET_AUTHENTICATION_NONCE:
+            with self.lock:
+                client.server_nonce = struct.pack('<I', self.next_nonce)
+                self.next_nonce += 1
+
+            self.send_response(client, request, client.server_nonce)
+        elif function_id == FUNCTION_AUTHENTICATE:
+            client_nonce = payload[:4]
+            digest = payload[4:24]
+
+            if self.secret is not None and client.server_nonce is not None:
+                h = hmac.new(self.secret.encode('ascii'), digestmod=hashlib.sha1)
+
+                h.update(client.server_nonce)
+                h.update(client_nonce)
+
+                if h.digest() == digest:
+                    client.authenticated = True
+                    self.send_response(client, request)
+                    return
+
+            # brickd closes the connection on a failed authentication
+            with self.lock:
+                if client in self.clients:
+                    self.clients.remove(client)
+
+            self.close_client(client)
+
+    def callback_loop(self, device, period):
+        # drift-free, each callback carries a counter to detect loss and
+        # reordering, the send times are recorded to measure the latency
+        value = 0
+        deadline = monotonic()
+
+        while self.running and device.callback_period == period:
+            with self.lock:
+                self.callback_send_times[(device.uid, value)] = monotonic()
+
+            self.broadcast_callback(device.uid, BrickletTemperature.CALLBACK_TEMPERATURE, struct.pack('<h', value))
+
+            value = (value + 1) % 32768
+            deadline += period / 1000.0
+            delay = deadline - monotonic()
+
+            if delay > 0:
+                time.sleep(delay)
+
+    def broadcast_callback(self, uid, function_id, payload):
+        # like brickd, callbacks go to all clients, not only to the one
+        # that configured them
+        with self.lock:
+            clients = [other for other in self.clients if self.secret is None or other.authenticated]
+
+        for other in clients:
+            self.send_callback(other, uid, function_id, payload)
+
+    def get_callback_send_time(self, uid, value):
+        with self.lock:
+            return self.callback_send_times.get((uid, value))
+
+class RuntimeTest(unittest.TestCase):
+    secret = None
+
+    def setUp(self):
+        self.brickd = FakeBrickDaemon(self.secret)
+        self.ipcon = IPConnection()
+        self.devices = []
+
+        for i in range(WORKER_COUNT):
+            uid = FIRST_DEVICE_UID + i
+
+            self.brickd.add_device(uid)
+            self.devices.append(BrickletTemperature(base58encode(uid), self.ipcon))
+
+        self.ipcon.connect('127.0.0.1', self.brickd.port)
+
+    def tearDown(self):
+        if self.ipcon.get_connection_state() != IPConnection.CONNECTION_STATE_DISCONNECTED:
+            self.ipcon.disconnect()
+        self.brickd.close()
+
+class GetterTest(RuntimeTest):
+    def check_getters(self, get_device, budget):
+        latencies = [[] for i in range(WORKER_COUNT)]
+
+        def worker(index):
+            device = get_device(index)
+            expected = device.uid % 10000
+
+            for i in range(GETTER_COUNT):
+                start = monotonic()
+                temperature = device.get_temperature()
+                latencies[index].append(monotonic() - start)
+
+                self.assertEqual(temperature, expected)
+
+        run_workers(worker, WORKER_COUNT)
+
+        p99 = get_percentile(sum(latencies, []), 99)
+
+        if CHECK_LATENCY_BUDGETS:
+            self.assertLess(p99, budget,
+                            'p99 getter latency {0:.2f} ms exceeds budget'.format(p99 * 1000))
+
+    def test_getters_per_device(self):
+        self.check_getters(lambda index: self.devices[index], P99_GETTER_LATENCY_BUDGET)
+
+    def test_getters_shared_device(self):
+        self.check_getters(lambda index: self.devices[0], P99_SHARED_GETTER_LATENCY_BUDGET)
+
+    def test_get_identity(self):
+        def worker(index):
+            identity = self.devices[index].get_identity()
+
+            self.assertEqual(identity.uid, base58encode(self.devices[index].uid))
+            self.assertEqual(identity.device_identifier, BrickletTemperature.DEVICE_IDENTIFIER)
+
+        run_workers(worker, WORKER_COUNT)
+
+    def test_enumerate(self):
+        uids = set()
+        done = threading.Event()
+
+        def cb_enumerate(uid, connected_uid, position, hardware_version, firmware_version,
+                         device_identifier, enumeration_type):
+            uids.add(uid)
+
+            if len(uids) == WORKER_COUNT:
+                done.set()
+
+        self.ipcon.register_callback(IPConnection.CALLBACK_ENUMERATE, cb_enumerate)
+        self.ipcon.enumerate()
+
+        done.wait(WAIT_TIMEOUT)
+
+        self.assertEqual(uids, set([base58encode(device.uid) for device in self.devices]))
+
+    def test_unknown_device_times_out(self):
+        device = BrickletTemperature(base58encode(FIRST_DEVICE_UID + WORKER_COUNT), self.ipcon)
+
+        self.ipcon.set_timeout(0.2)
+
+        try:
+            device.get_temperature()
+        except Error as e:
+            self.assertEqual(e.value, Error.TIMEOUT)
+        else:
+            self.fail('Getter of unknown device did not time out')
+
+        # the connection is still usable after a timeout
+        self.assertEqual(self.devices[0].get_temperature(), FIRST_DEVICE_UID % 10000)
+
+class SetterTest(RuntimeTest):
+    def check_setters(self, response_expected):
+        def worker(index):
+            device = self.devices[index]
+
+            device.set_response_expected(BrickletTemperature.FUNCTION_SET_DEBOUNCE_PERIOD, response_expected)
+
+            for i in range(SETTER_COUNT):
+                debounce = index * 1000 + i
+
+                # requests of one device are answered in order, so the getter
+                # sees the new value even without a setter response
+                device.set_debounce_period(debounce)
+
+                self.assertEqual(device.get_debounce_period(), debounce)
+
+        run_workers(worker, WORKER_COUNT)
+
+    def test_setters_with_response(self):
+        self.check_setters(True)
+
+    def test_setters_without_response(self):
+        self.check_setters(False)
+
+    def test_setter_not_supported(self):
+        device = self.devices[0]
+
+        device.set_response_expected(BrickletTemperature.FUNCTION_SET_I2C_MODE, True)
+
+        try:
+            device.set_i2c_mode(BrickletTemperature.I2C_MODE_FAST)
+        except Error as e:
+            self.assertEqual(e.value, Error.NOT_SUPPORTED)
+        else:
+            self.fail('Unsupported setter did not fail')
+
+class ResponseCacheTest(RuntimeTest):
+    def test_invalidate_while_in_flight(self):
+        fake = self.brickd.devices[FIRST_DEVICE_UID]
+        device = self.devices[0]
+        gate = threading.Event()
+        results = []
+
+        device.set_response_cache_ttl(BrickletTemperature.FUNCTION_GET_DEBOUNCE_PERIOD, 60)
+        device.set_response_expected(BrickletTemperature.FUNCTION_SET_DEBOUNCE_PERIOD, False)
+
+        fake.debounce_gate = gate
+        thread = threading.Thread(target=lambda: results.append(device.get_debounce_period()))
+        thread.daemon = True
+        thread.start()
+
+        # the getter response carries the old value, the setter invalidates
+        # the cache before it arrives
+        self.assertTrue(fake.debounce_requested.wait(WAIT_TIMEOUT))
+        device.set_debounce_period(200)
+
+        fake.debounce_gate = None
+        gate.set()
+        thread.join(WAIT_TIMEOUT)
+
+        self.assertEqual(results, [100])
+        self.assertEqual(device.get_debounce_period(), 200)
+
+    def test_getter_between_invalidation_and_setter(self):
+        device = self.devices[0]
+        send = self.ipcon.send
+
+        device.set_response_cache_ttl(BrickletTemperature.FUNCTION_GET_DEBOUNCE_PERIOD, 60)
+        device.set_response_expected(BrickletTemperature.FUNCTION_SET_DEBOUNCE_PERIOD, False)
+
+        # a getter of another thread runs after the setter invalidated the
+        # cache, but before the setter is sent
+        def send_interleaved(packet, *args):
+            uid, length, function_id = struct.unpack('<IBB', packet[:6])
+
+            if function_id == BrickletTemperature.FUNCTION_SET_DEBOUNCE_PERIOD:
+                thread = threading.Thread(target=device.get_debounce_period)
+                thread.daemon = True
+                thread.start()
+                thread.join(WAIT_TIMEOUT)
+
+            send(packet, *args)
+
+        self.ipcon.send = send_interleaved
+
+        try:
+            device.set_debounce_period(200)
+        finally:
+            self.ipcon.send = send
+
+        self.assertEqual(device.get_debounce_period(), 200)
+
+class CallbackTest(RuntimeTest):
+    def test_callbacks(self):
+        received = [[] for i in range(WORKER_COUNT)] # (value, receive time)
+
+        for index, device in enumerate(self.devices):
+            device.register_callback(BrickletTemperature.CALLBACK_TEMPERATURE,
+                                     lambda value, index=index: received[index].append((value, monotonic())))
+
+        def start(index):
+            self.devices[index].set_temperature_callback_period(CALLBACK_PERIOD)
+
+        def stop(index):
+            self.devices[index].set_temperature_callback_period(0)
+
+        run_workers(start, WORKER_COUNT)
+        time.sleep(CALLBACK_DURATION)
+        run_workers(stop, WORKER_COUNT)
+        time.sleep(0.1)
+
+        latencies = []
+
+        for index, device in enumerate(self.devices):
+            values = [value for value, receive_time in received[index]]
+
+            # no callback is lost or reordered on loopback
+            self.assertGreater(len(values), CALLBACK_DURATION * 1000 / CALLBACK_PERIOD / 2)
+            self.assertEqual(values, list(range(len(values))))
+
+            for value, receive_time in received[index]:
+                latencies.append(receive_time - self.brickd.get_callback_send_time(device.uid, value))
+
+        p99 = get_percentile(latencies, 99)
+
+        if CHECK_LATENCY_BUDGETS:
+            self.assertLess(p99, P99_CALLBACK_LATENCY_BUDGET,
+                            'p99 callback latency {0:.2f} ms exceeds budget'.format(p99 * 1000))
+
+    def test_callbacks_while_calling_getters(self):
+        counts = [0] * WORKER_COUNT
+
+        def cb_temperature(index, value):
+            counts[index] += 1
+
+        for index, device in enumerate(self.devices):
+            device.register_callback(BrickletTemperature.CALLBACK_TEMPERATURE,
+                                     lambda value, index=index: cb_temperature(index, value))
+
+        def worker(index):
+            device = self.devices[index]
+
+            device.set_temperature_callback_period(CALLBACK_PERIOD)
+
+            for i in range(GETTER_COUNT):
+                self.assertEqual(device.get_temperature(), device.uid % 10000)
+
+            device.set_temperature_callback_period(0)
+
+        run_workers(worker, WORKER_COUNT)
+
+        for count in counts:
+            self.assertGreater(count, 0)
+
+    def test_listeners(self):
+        device = self.devices[0]
+        received = [], [], [] # registered callback, first and second listener
+
+        device.register_callback(BrickletTemperature.CALLBACK_TEMPERATURE, received[0].append)
+        device.add_listener(BrickletTemperature.CALLBACK_TEMPERATURE, received[1].append)
+        token = device.add_listener(BrickletTemperature.CALLBACK_TEMPERATURE, received[2].append)
+        device.set_temperature_callback_period(CALLBACK_PERIOD)
+
+        self.assertTrue(wait_until(lambda: len(received[2]) >= 10))
+
+        device.remove_listener(token)
+        removed_count = len(received[2])
+
+        self.assertTrue(wait_until(lambda: len(received[1]) >= removed_count + 10))
+
+        device.set_temperature_callback_period(0)
+        time.sleep(0.1)
+
+        # all get the same values, a removed listener only misses the later
+        # ones. at most one callback was already dispatched while removing
+        self.assertEqual(received[1], received[0])
+        self.assertEqual(received[2], received[1][:len(received[2])])
+        self.assertLessEqual(len(received[2]), removed_count + 1)
+
+class PollingSchedulerTest(RuntimeTest):
+    def poll(self, getters, count):
+        # polls the (device, getter) pairs until each got count results
+        results = {} # token -> results
+        done = threading.Event()
+
+        def cb_batch(batch):
+            for result in batch:
+                results[result.token].append(result)
+
+            if min([len(token_results) for token_results in results.values()]) >= count:
+                done.set()
+
+        scheduler = PollingScheduler(cb_batch, max_in_flight=1, batch_interval=0.02)
+        tokens = []
+
+        for device, getter in getters:
+            token = scheduler.add(device, getter, 0.02)
+            results[token] = []
+            tokens.append(token)
+
+        scheduler.start()
+
+        try:
+            self.assertTrue(done.wait(WAIT_TIMEOUT), 'Not enough poll results')
+        finally:
+            scheduler.stop()
+
+        return [results[token] for token in tokens]
+
+    def test_poll_getters(self):
+        all_results = self.poll([(device, 'get_temperature') for device in self.devices[:4]], 5)
+
+        for device, results in zip(self.devices, all_results):
+            for result in results:
+                self.assertEqual((result.device, result.getter, result.value, result.error),
+                                 (device, 'get_temperature', device.uid % 10000, None))
+
+    def test_getter_exception(self):
+        def get_broken():
+            raise TypeError('broken getter')
+
+        # the worker survives the exception and the entry becomes due again
+        broken_results, results = self.poll([(self.devices[0], get_broken),
+                                             (self.devices[1], 'get_temperature')], 3)
+
+        for result in broken_results:
+            self.assertTrue(isinstance(result.error, TypeError))
+
+        for result in results:
+            self.assertEqual(result.error, None)
+
+class CallbackPipelineTest(RuntimeTest):
+    def test_decimation_and_window(self):
+        device = self.devices[0]
+        statistics = []
+        done = threading.Event()
+
+        def listener(window):
+            statistics.append(window)
+
+            if len(statistics) == 3:
+                done.set()
+
+        pipeline = CallbackPipeline(listener).add_decimation(2).add_window(4)
+        pipeline.attach(device, BrickletTemperature.CALLBACK_TEMPERATURE)
+        device.set_temperature_callback_period(CALLBACK_PERIOD)
+
+        try:
+            self.assertTrue(done.wait(WAIT_TIMEOUT))
+        finally:
+            device.set_temperature_callback_period(0)
+
+        # the fake sends a counter, every second value gets into the window
+        for window in statistics[:3]:
+            self.assertEqual((window.max - window.min, window.mean, window.count),
+                             (6, (window.min + window.max) / 2.0, 4))
+
+        for previous, window in zip(statistics[:2], statistics[1:3]):
+            self.assertEqual(window.min, previous.max + 2)
+
+    def test_listener_reenters_pipeline(self):
+        values = []
+
+        def listener(value):
+            values.append(value)
+
+            # would deadlock if the pipeline held its lock while calling
+            if value == 1:
+                pipeline(2)
+
+        pipeline = CallbackPipeline(listener).add_deadband(1)
+        pipeline(1)
+
+        self.assertEqual(values, [1, 2])
+
+class TracingTest(RuntimeTest):
+    def test_request_traces(self):
+        traces = []
+        lock = threading.Lock()
+
+        def trace_sink(trace):
+            with lock:
+                traces.append(trace)
+
+        self.ipcon.set_trace_sink(trace_sink)
+
+        # requests of all workers overlap, each trace gets the receive time
+        # of its own response
+        def worker(index):
+            device = self.devices[index % 4]
+
+            for i in range(GETTER_COUNT // 10):
+                device.get_temperature()
+
+        run_workers(worker, WORKER_COUNT)
+
+        self.ipcon.set_trace_sink(None)
+
+        self.assertEqual(len(traces), WORKER_COUNT * (GETTER_COUNT // 10))
+
+        for trace in traces:
+            self.assertEqual(trace.function_id, BrickletTemperature.FUNCTION_GET_TEMPERATURE)
+            # the response can arrive before the sending thread took the sent time
+            self.assertTrue(trace.created <= trace.lock_acquired <= trace.sent <= trace.returned, trace)
+            self.assertTrue(trace.lock_acquired <= trace.received <= trace.returned, trace)
+
+    def test_callback_traces(self):
+        traces = []
+        receive_times = []
+        done = threading.Event()
+        device = self.devices[0]
+
+        def trace_sink(trace):
+            # the setter is traced too
+            if isinstance(trace, CallbackTrace):
+                traces.append(trace)
+
+            if len(traces) == 10:
+                done.set()
+
+        device.register_callback(BrickletTemperature.CALLBACK_TEMPERATURE,
+                                 lambda value: receive_times.append(self.ipcon.get_callback_receive_timestamp()))
+
+        self.ipcon.set_trace_sink(trace_sink)
+        device.set_temperature_callback_period(CALLBACK_PERIOD)
+
+        try:
+            self.assertTrue(done.wait(WAIT_TIMEOUT))
+        finally:
+            device.set_temperature_callback_period(0)
+            self.ipcon.set_trace_sink(None)
+
+        for trace, received in zip(traces[:10], receive_times[:10]):
+            self.assertEqual(trace.received, received)
+            self.assertTrue(trace.received <= trace.dequeued <= trace.returned, trace)
+
+        # only available while tracing
+        self.assertEqual(self.ipcon.get_callback_receive_timestamp(), None)
+
+# publishes and consumes a ring in one process, the resource tracker must not
+# complain about the block at exit
+RING_SCRIPT = '''
+import struct
+from tinkerforge.ip_connection import IPConnection
+from tinkerforge.bricklet_temperature import BrickletTemperature
+from tinkerforge.callback_ring import CallbackRingPublisher, CallbackRingConsumer
+
+ipcon = IPConnection()
+device = BrickletTemperature('a', ipcon)
+publisher = CallbackRingPublisher(ipcon)
+consumer = CallbackRingConsumer(publisher.publish(device, BrickletTemperature.CALLBACK_TEMPERATURE, name='{0}'))
+publisher.tap(struct.pack('<IBBBBh', device.uid, 10, BrickletTemperature.CALLBACK_TEMPERATURE, 0, 0, 42))
+print(consumer.read()[0][1])
+consumer.close()
+publisher.close()
+'''
+
+class CallbackRingTest(RuntimeTest):
+    def setUp(self):
+        if callback_ring.shared_memory is None:
+            self.skipTest('requires multiprocessing.shared_memory')
+
+        RuntimeTest.setUp(self)
+
+    def test_publish_and_consume(self):
+        device = self.devices[0]
+        publisher = callback_ring.CallbackRingPublisher(self.ipcon)
+        name = publisher.publish(device, BrickletTemperature.CALLBACK_TEMPERATURE,
+                                 name='tf_test_{0}'.format(os.getpid()))
+
+        try:
+            consumer = callback_ring.CallbackRingConsumer(name)
+
+            try:
+                device.set_temperature_callback_period(CALLBACK_PERIOD)
+                deadline = monotonic() + WAIT_TIMEOUT
+                records = []
+
+                while len(records) < 10 and monotonic() < deadline:
+                    records += consumer.read()
+                    time.sleep(0.01)
+
+                device.set_temperature_callback_period(0)
+
+                # the fake sends a counter, nothing is lost
+                values = [values[0] for timestamp, values in records]
+
+                self.assertGreaterEqual(len(values), 10)
+                self.assertEqual(values, list(range(values[0], values[0] + len(values))))
+                self.assertEqual(consumer.get_lost_count(), 0)
+            finally:
+                consumer.close()
+        finally:
+            publisher.close()
+
+    def test_consumer_in_publisher_process(self):
+        process = subprocess.Popen([sys.executable, '-c', RING_SCRIPT.format('tf_test_{0}'.format(os.getpid()))],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   env=dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(callback_ring.__file__)))))
+        stdout, stderr = process.communicate()
+
+        self.assertEqual((process.returncode, stdout.decode('utf-8'), stderr.decode('utf-8')), (0, '(42,)\n', ''))
+
+class PacketCounter:
+    def __init__(self):
+        self.count = 0
+
+    def tap(self, packet):
+        self.count += 1
+
+class PacketTapTest(RuntimeTest):
+    def test_remove_bound_method_tap(self):
+        counter = PacketCounter()
+        device = self.devices[0]
+
+        self.ipcon.add_packet_tap(counter.tap)
+        device.set_temperature_callback_period(CALLBACK_PERIOD)
+        time.sleep(0.1)
+
+        # a new bound method object, equal but not identical to the added one
+        self.ipcon.remove_packet_tap(counter.tap)
+        time.sleep(0.02) # a packet might be in the tap while removing
+
+        count = counter.count
+
+        time.sleep(0.1)
+        device.set_temperature_callback_period(0)
+
+        self.assertGreater(count, 0)
+        self.assertEqual(counter.count, count)
+
+class LEDStripTest(RuntimeTest):
+    def setUp(self):
+        RuntimeTest.setUp(self)
+
+        uid = FIRST_DEVICE_UID + WORKER_COUNT
+
+        self.led_strip = self.brickd.add_led_strip(uid, LED_COUNT)
+        self.device = BrickletLEDStrip(base58encode(uid), self.ipcon)
+
+        # one frame of distinct colors, split over several requests
+        self.r = [i % 256 for i in range(LED_COUNT)]
+        self.g = [(i * 3) % 256 for i in range(LED_COUNT)]
+        self.b = [(i * 7) % 256 for i in range(LED_COUNT)]
+
+    def check_frame(self):
+        # the getter is answered after all frame requests were handled
+        self.assertEqual(self.device.get_rgb_values(0, 1).r[0], self.r[0])
+        self.assertEqual((self.led_strip.r, self.led_strip.g, self.led_strip.b), (self.r, self.g, self.b))
+
+    def get_flat_frame(self):
+        return sum([[r, g, b] for r, g, b in zip(self.r, self.g, self.b)], [])
+
+    def test_rgb_frame_arrays(self):
+        self.device.set_rgb_frame(self.r, self.g, self.b)
+        self.check_frame()
+
+    def test_rgb_frame_triples(self):
+        self.device.set_rgb_frame(list(zip(self.r, self.g, self.b)))
+        self.check_frame()
+
+    def test_rgb_frame_flat(self):
+        self.device.set_rgb_frame(self.get_flat_frame())
+        self.check_frame()
+
+    @unittest.skipIf(numpy is None, 'requires numpy')
+    def test_rgb_frame_numpy_flat(self):
+        self.device.set_rgb_frame(numpy.array(self.get_flat_frame(), dtype=numpy.uint8))
+        self.check_frame()
+
+    @unittest.skipIf(numpy is None, 'requires numpy')
+    def test_rgb_frame_numpy_triples(self):
+        self.device.set_rgb_frame(numpy.array(list(zip(self.r, self.g, self.b)), dtype=numpy.uint8))
+        self.check_frame()
+
+    @unittest.skipIf(numpy is None, 'requires numpy')
+    def test_rgb_frame_numpy_arrays(self):
+        self.device.set_rgb_frame(numpy.array(self.r), numpy.array(self.g), numpy.array(self.b))
+        self.check_frame()
+
+    def test_rgb_frame_paced(self):
+        rendered = []
+
+        # the registered callback is still called while pacing
+        self.device.register_callback(BrickletLEDStrip.CALLBACK_FRAME_RENDERED, rendered.append)
+
+        for i in range(3):
+            self.device.set_rgb_frame(self.r, self.g, self.b, paced=True)
+
+        self.check_frame()
+        self.assertTrue(wait_until(lambda: len(rendered) == 3))
+        self.assertEqual(rendered, [LED_COUNT] * 3)
+
+        # the next frame waits for the callback of the previous one
+        self.led_strip.render_frames = False
+        self.device.set_rgb_frame(self.r, self.g, self.b, paced=True)
+        self.ipcon.set_timeout(0.2)
+
+        try:
+            self.device.set_rgb_frame(self.r, self.g, self.b, paced=True)
+        except Error as e:
+            self.assertEqual(e.value, Error.TIMEOUT)
+        else:
+            self.fail('Paced frame did not wait for the frame rendered callback')
+
+    def check_array_mode(self, array_type):
+        self.device.set_rgb_frame(self.r, self.g, self.b)
+
+        # the second set_rgb_values request of the frame
+        values = self.device.get_rgb_values(16, 16)
+
+        for value, expected in zip(values, [self.r, self.g, self.b]):
+            self.assertTrue(isinstance(value, array_type))
+            self.assertEqual(value.tolist(), expected[16:32])
+
+        return values
+
+    def test_array_mode_array(self):
+        self.ipcon.set_array_mode(IPConnection.ARRAY_MODE_ARRAY)
+        self.check_array_mode(array.array)
+
+    @unittest.skipIf(numpy is None, 'requires numpy')
+    def test_array_mode_numpy(self):
+        self.ipcon.set_array_mode(IPConnection.ARRAY_MODE_NUMPY)
+
+        # views over the response payload
+        for value in self.check_array_mode(numpy.ndarray):
+            self.assertFalse(value.flags.writeable)
+
+class BrickletPluginTest(RuntimeTest):
+    def setUp(self):
+        RuntimeTest.setUp(self)
+
+        uid = FIRST_DEVICE_UID + WORKER_COUNT
+
+        self.master = self.brickd.add_master(uid)
+        self.device = BrickMaster(base58encode(uid), self.ipcon)
+
+        # not a multiple of the chunk size, the last chunk is padded
+        self.plugin = [(i * 7) % 256 for i in range(1000)]
+        self.padded = self.plugin + [0] * (-len(self.plugin) % IPConnection.PLUGIN_CHUNK_SIZE)
+
+        # the retries have to happen well before the test times out
+        self.ipcon.set_timeout(0.2)
+
+    def test_write_read_verify(self):
+        # one window drops a write, another one answers a read too late,
+        # both have to be resend
+        self.master.faults[(IPConnection.FUNCTION_WRITE_BRICKLET_PLUGIN, 3)] = None
+        self.master.faults[(IPConnection.FUNCTION_READ_BRICKLET_PLUGIN, 5)] = 0.3
+
+        self.ipcon.write_bricklet_plugin_bulk(self.device, 'a', self.plugin, window=4)
+
+        self.assertEqual(len(self.master.faults), 1)
+        self.assertEqual(sum([list(bytearray(self.master.plugin[i])) for i in range(len(self.master.plugin))], []),
+                         self.padded)
+
+        self.assertTrue(self.ipcon.verify_bricklet_plugin(self.device, 'a', self.plugin, window=4))
+        self.assertEqual(len(self.master.faults), 0)
+
+        self.assertEqual(self.ipcon.read_bricklet_plugin_bulk(self.device, 'a', 100, window=4), self.plugin[:100])
+
+        modified = list(self.plugin)
+        modified[500] ^= 1
+
+        self.assertFalse(self.ipcon.verify_bricklet_plugin(self.device, 'a', modified, window=4))
+
+class TopologyCacheTest(RuntimeTest):
+    def setUp(self):
+        RuntimeTest.setUp(self)
+
+        # an empty cache
+        handle, self.filename = tempfile.mkstemp(suffix='.json')
+        os.write(handle, b'[]')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+        RuntimeTest.tearDown(self)
+
+    def get_raw_entry(self, uid, firmware_version):
+        # as enumerated by the fake
+        return {'uid': base58encode(uid), 'connected_uid': '0', 'position': 'a',
+                'hardware_version': [1, 1, 0], 'firmware_version': firmware_version,
+                'device_identifier': BrickletTemperature.DEVICE_IDENTIFIER}
+
+    def load_file(self):
+        with open(self.filename, 'r') as f:
+            return json.load(f)
+
+    def create_cache(self):
+        cache = TopologyCache(self.ipcon, self.filename)
+        events = {TopologyCache.CALLBACK_DEVICE_ADDED: [],
+                  TopologyCache.CALLBACK_DEVICE_CHANGED: [],
+                  TopologyCache.CALLBACK_DEVICE_REMOVED: []}
+
+        def register(id):
+            cache.register_callback(id, lambda *args: events[id].append(args))
+
+        for id in events:
+            register(id)
+
+        return cache, events
+
+    def test_load_and_refresh_on_connect(self):
+        # one cached device is gone, another one got a firmware update
+        gone_uid = base58encode(FIRST_DEVICE_UID + WORKER_COUNT)
+        changed_uid = base58encode(FIRST_DEVICE_UID)
+
+        with open(self.filename, 'w') as f:
+            json.dump([self.get_raw_entry(FIRST_DEVICE_UID + WORKER_COUNT, [2, 0, 1]),
+                       self.get_raw_entry(FIRST_DEVICE_UID, [2, 0, 0])], f)
+
+        self.ipcon.disconnect()
+
+        # the devices are known before connecting
+        cache, events = self.create_cache()
+        devices = cache.create_devices()
+
+        self.assertEqual(sorted(devices.keys()), sorted([gone_uid, changed_uid]))
+
+        for device in devices.values():
+            self.assertTrue(isinstance(device, BrickletTemperature))
+
+        self.ipcon.connect('127.0.0.1', self.brickd.port)
+
+        # the file is written once the refresh is finished
+        self.assertTrue(wait_until(lambda: len(self.load_file()) == WORKER_COUNT))
+
+        removed = events[TopologyCache.CALLBACK_DEVICE_REMOVED]
+        changed = events[TopologyCache.CALLBACK_DEVICE_CHANGED]
+        added = events[TopologyCache.CALLBACK_DEVICE_ADDED]
+
+        self.assertEqual([entry.uid for entry, in removed], [gone_uid])
+        self.assertEqual([(old_entry.uid, old_entry.firmware_version, new_entry.firmware_version)
+                          for old_entry, new_entry in changed], [(changed_uid, (2, 0, 0), (2, 0, 1))])
+        self.assertEqual(sorted([entry.uid for entry, in added]),
+                         sorted([base58encode(device.uid) for device in self.devices[1:]]))
+
+        self.assertEqual(self.load_file(), [self.get_raw_entry(uid, [2, 0, 1]) for uid in
+                                            sorted([device.uid for device in self.devices],
+                                                   key=base58encode)])
+        self.assertEqual(TopologyCache(IPConnection(), self.filename).load(), cache.get_entries())
+
+    def test_refresh_on_reconnect(self):
+        # already connected, the refresh starts right away
+        cache, events = self.create_cache()
+
+        self.assertTrue(wait_until(lambda: len(self.load_file()) == WORKER_COUNT))
+
+        new_uid = FIRST_DEVICE_UID + WORKER_COUNT
+        self.brickd.add_device(new_uid)
+        self.ipcon.disconnect()
+        self.ipcon.connect('127.0.0.1', self.brickd.port)
+
+        self.assertTrue(wait_until(lambda: len(self.load_file()) == WORKER_COUNT + 1))
+        self.assertEqual(events[TopologyCache.CALLBACK_DEVICE_ADDED][-1][0].uid, base58encode(new_uid))
+        self.assertEqual(events[TopologyCache.CALLBACK_DEVICE_REMOVED], [])
+
+class IPConnectionPoolTest(RuntimeTest):
+    def setUp(self):
+        RuntimeTest.setUp(self)
+
+        # a second endpoint with its own devices
+        self.other_brickd = FakeBrickDaemon()
+        self.endpoints = {} # uid -> (host, port)
+
+        for device in self.devices:
+            self.endpoints[device.uid] = ('127.0.0.1', self.brickd.port)
+
+        for i in range(2):
+            uid = FIRST_DEVICE_UID + WORKER_COUNT + i
+
+            self.other_brickd.add_device(uid)
+            self.endpoints[uid] = ('127.0.0.1', self.other_brickd.port)
+
+        self.pool = IPConnectionPool()
+        self.pool.connect('127.0.0.1', self.brickd.port)
+        self.pool.connect('127.0.0.1', self.other_brickd.port)
+
+    def tearDown(self):
+        self.pool.disconnect()
+        self.other_brickd.close()
+
+        RuntimeTest.tearDown(self)
+
+    def has_routes(self):
+        for uid, endpoint in self.endpoints.items():
+            if self.pool.get_route(base58encode(uid)) != endpoint:
+                return False
+
+        return True
+
+    def test_routing(self):
+        # learned from the enumerate callbacks of each endpoint
+        self.assertTrue(wait_until(self.has_routes))
+
+        devices = [BrickletTemperature(base58encode(uid), self.pool) for uid in sorted(self.endpoints.keys())]
+
+        def worker(index):
+            device = devices[index]
+
+            for i in range(10):
+                self.assertEqual(device.get_temperature(), device.uid % 10000)
+
+        run_workers(worker, len(devices))
+
+        self.assertIsNot(self.pool.get_connection(devices[0]), self.pool.get_connection(devices[-1]))
+
+    def check_callbacks_without_request(self, device):
+        received = []
+
+        device.register_callback(BrickletTemperature.CALLBACK_TEMPERATURE, received.append)
+
+        # configured through the direct connection, brickd sends the
+        # callbacks to all clients
+        self.devices[0].set_temperature_callback_period(CALLBACK_PERIOD)
+
+        self.assertTrue(wait_until(lambda: len(received) >= 10))
+
+        self.devices[0].set_temperature_callback_period(0)
+
+    def test_callbacks_with_learned_route(self):
+        self.assertTrue(wait_until(self.has_routes))
+
+        self.check_callbacks_without_request(BrickletTemperature(base58encode(self.devices[0].uid), self.pool))
+
+    def test_callbacks_with_route_set_before_connect(self):
+        pool = IPConnectionPool()
+        pool.set_route(base58encode(self.devices[0].uid), '127.0.0.1', self.brickd.port)
+        device = BrickletTemperature(base58encode(self.devices[0].uid), pool)
+        pool.connect('127.0.0.1', self.brickd.port)
+
+        try:
+            self.check_callbacks_without_request(device)
+        finally:
+            pool.disconnect()
+
+class EnumerateEndpointsTest(RuntimeTest):
+    def test_enumerate_endpoints(self):
+        # the first device is reachable through both endpoints
+        other_brickd = FakeBrickDaemon()
+        other_uids = [FIRST_DEVICE_UID, FIRST_DEVICE_UID + WORKER_COUNT]
+
+        for uid in other_uids:
+            other_brickd.add_device(uid)
+
+        # nothing listens on a port that was just released
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        probe.bind(('127.0.0.1', 0))
+        closed_endpoint = ('127.0.0.1', probe.getsockname()[1])
+        probe.close()
+
+        endpoints = [('127.0.0.1', self.brickd.port), ('127.0.0.1', other_brickd.port), closed_endpoint]
+        found = []
+
+        try:
+            topology, errors = enumerate_endpoints(endpoints, idle_timeout=0.2, callback=found.append)
+        finally:
+            other_brickd.close()
+
+        uids = [base58encode(device.uid) for device in self.devices] + [base58encode(other_uids[1])]
+
+        self.assertEqual(sorted(topology.keys()), sorted(uids))
+        self.assertEqual(sorted([entry.uid for entry in found]), sorted(uids))
+        self.assertEqual(list(errors.keys()), [closed_endpoint])
+
+        for uid, entry in topology.items():
+            self.assertEqual(entry.uid, uid)
+            self.assertIn((entry.host, entry.port), endpoints[:2])
+
+        self.assertEqual(topology[uids[-1]].port, other_brickd.port)
+
+class BrickProxyTest(RuntimeTest):
+    def setUp(self):
+        RuntimeTest.setUp(self)
+
+        self.proxy = BrickProxy('127.0.0.1', self.brickd.port)
+        self.proxy.listen('127.0.0.1', 0)
+        self.clients = []
+
+        for i in range(2):
+            ipcon = IPConnection()
+            ipcon.connect('127.0.0.1', self.proxy.get_listen_port())
+            self.clients.append(ipcon)
+
+    def tearDown(self):
+        for ipcon in self.clients:
+            ipcon.disconnect()
+
+        self.proxy.close()
+
+        RuntimeTest.tearDown(self)
+
+    def test_getters(self):
+        # every device is used by both clients at the same time
+        def worker(index):
+            uid = self.devices[index // 2].uid
+            device = BrickletTemperature(base58encode(uid), self.clients[index % 2])
+
+            for i in range(20):
+                self.assertEqual(device.get_temperature(), uid % 10000)
+
+        run_workers(worker, 2 * WORKER_COUNT)
+
+        statistics = self.proxy.get_statistics()
+
+        self.assertEqual(statistics.clients, 2)
+        self.assertEqual(statistics.requests, 2 * WORKER_COUNT * 20)
+        self.assertEqual(statistics.forwarded + statistics.deduplicated, statistics.requests)
+
+        # the upstream connection is shared, brickd only sees the proxy
+        self.assertEqual(self.brickd.get_client_count(), 2) # self.ipcon and the proxy
+
+    def test_callbacks(self):
+        uid = base58encode(self.devices[0].uid)
+        devices = [BrickletTemperature(uid, ipcon) for ipcon in self.clients]
+        received = [[] for device in devices]
+
+        for device, device_received in zip(devices, received):
+            device.register_callback(BrickletTemperature.CALLBACK_TEMPERATURE, device_received.append)
+
+        # configured by one client, received by both
+        devices[0].set_temperature_callback_period(CALLBACK_PERIOD)
+
+        self.assertTrue(wait_until(lambda: min([len(values) for values in received]) >= 10))
+
+        devices[0].set_temperature_callback_period(0)
+
+        for values in received:
+            self.assertEqual(values, list(range(values[0], values[0] + len(values))))
+
+class CallbackRecorderTest(RuntimeTest):
+    def setUp(self):
+        RuntimeTest.setUp(self)
+
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+        RuntimeTest.tearDown(self)
+
+    def test_record(self):
+        device = self.devices[0]
+        received = []
+        recorder = CallbackRecorder(self.ipcon, self.directory, flush_interval=0.05)
+
+        recorder.record(device, BrickletTemperature.CALLBACK_TEMPERATURE)
+        device.register_callback(BrickletTemperature.CALLBACK_TEMPERATURE, received.append)
+        device.set_temperature_callback_period(CALLBACK_PERIOD)
+
+        self.assertTrue(wait_until(lambda: len(received) >= 20))
+
+        device.set_temperature_callback_period(0)
+        time.sleep(0.1)
+        recorder.close()
+
+        reader = CallbackRecordingReader(self.directory, base58encode(device.uid),
+                                         BrickletTemperature.CALLBACK_TEMPERATURE)
+        timestamps, columns = reader.read()
+        timestamps = [float(timestamp) for timestamp in timestamps]
+
+        self.assertEqual([int(value) for value in columns[0]], received)
+        self.assertEqual(timestamps, sorted(timestamps))
+
+        # a range read only decodes the rows from the start timestamp on
+        middle = len(timestamps) // 2
+        timestamps, columns = reader.read(timestamps[middle])
+
+        self.assertEqual([int(value) for value in columns[0]], received[middle:])
+
+class ReconnectTest(RuntimeTest):
+    def test_auto_reconnect(self):
+        connected = threading.Event()
+        reasons = []
+
+        # the connected callback of the initial connect might still be queued
+        def cb_connected(connect_reason):
+            if connect_reason == IPConnection.CONNECT_REASON_AUTO_RECONNECT:
+                reasons.append(connect_reason)
+                connected.set()
+
+        self.ipcon.register_callback(IPConnection.CALLBACK_CONNECTED, cb_connected)
+
+        stop = threading.Event()
+        successes = [0] * WORKER_COUNT
+
+        def worker(index):
+            device = self.devices[index]
+
+            # getters fail while the connection is down, but never return a
+            # wrong value
+            while not stop.is_set():
+                try:
+                    self.assertEqual(device.get_temperature(), device.uid % 10000)
+                    successes[index] += 1
+                except Error:
+                    time.sleep(0.01)
+
+        self.ipcon.set_timeout(0.2)
+
+        workers = threading.Thread(target=run_workers, args=(worker, WORKER_COUNT))
+        workers.daemon = True
+        workers.start()
+
+        time.sleep(0.1)
+
+        start = monotonic()
+
+        self.brickd.drop_clients()
+
+        self.assertTrue(connected.wait(WAIT_TIMEOUT), 'No auto-reconnect')
+
+        duration = monotonic() - start
+
+        del successes[:]
+        successes.extend([0] * WORKER_COUNT)
+        time.sleep(0.2)
+        stop.set()
+        workers.join()
+
+        self.assertEqual(reasons, [IPConnection.CONNECT_REASON_AUTO_RECONNECT])
+        self.assertLess(duration, RECONNECT_BUDGET)
+        self.assertEqual(self.ipcon.get_connection_state(), IPConnection.CONNECTION_STATE_CONNECTED)
+
+        for count in successes:
+            self.assertGreater(count, 0)
+
+    def test_no_auto_reconnect(self):
+        disconnected = threading.Event()
+
+        self.ipcon.set_auto_reconnect(False)
+        self.ipcon.register_callback(IPConnection.CALLBACK_DISCONNECTED, lambda reason: disconnected.set())
+        self.brickd.drop_clients()
+
+        self.assertTrue(disconnected.wait(WAIT_TIMEOUT))
+
+        time.sleep(0.2)
+
+        self.assertEqual(self.ipcon.get_connection_state(), IPConnection.CONNECTION_STATE_DISCONNECTED)
+        self.assertEqual(self.brickd.get_client_count(), 0)
+
+class AuthenticationTest(RuntimeTest):
+    secret = 'My Authentication Secret!'
+
+    def test_authenticate(self):
+        self.ipcon.authenticate(self.secret)
+
+        self.assertEqual(self.devices[0].get_temperature(), FIRST_DEVICE_UID % 10000)
+
+    def test_unauthenticated_request_times_out(self):
+        self.ipcon.set_timeout(0.2)
+
+        try:
+            self.devices[0].get_temperature()
+        except Error as e:
+            self.assertEqual(e.value, Error.TIMEOUT)
+        else:
+            self.fail('Unauthenticated getter did not time out')
+
+    def test_wrong_secret(self):
+        self.ipcon.set_auto_reconnect(False)
+        self.ipcon.set_timeout(0.2)
+
+        self.assertRaises(Error, self.ipcon.authenticate, 'wrong secret')
+
+    def test_parallel_connections(self):
+        def worker(index):
+            ipcon = IPConnection()
+            device = BrickletTemperature(base58encode(self.devices[index].uid), ipcon)
+
+            ipcon.connect('127.0.0.1', self.brickd.port)
+
+            try:
+                ipcon.authenticate(self.secret)
+
+                for i in range(GETTER_COUNT // 10):
+                    self.assertEqual(device.get_temperature(), (FIRST_DEVICE_UID + index) % 10000)
+            finally:
+                ipcon.disconnect()
+
+        run_workers(worker, WORKER_COUNT)
+
+    def test_auto_reauthenticate(self):
+        connected = threading.Event()
+
+        def cb_connected(connect_reason):
+            if connect_reason == IPConnection.CONNECT_REASON_AUTO_RECONNECT:
+                connected.set()
+
+        self.ipcon.register_callback(IPConnection.CALLBACK_CONNECTED, cb_connected)
+        self.ipcon.authenticate(self.secret)
+        self.brickd.drop_clients()
+
+        self.assertTrue(connected.wait(WAIT_TIMEOUT), 'No auto-reconnect')
+
+        # the connected callback is called before the reauthentication is done
+        deadline = monotonic() + WAIT_TIMEOUT
+        self.ipcon.set_timeout(0.2)
+
+        while True:
+            try:
+                self.assertEqual(self.devices[0].get_temperature(), FIRST_DEVICE_UID % 10000)
+                break
+            except Error:
+                if monotonic() > deadline:
+                    raise
+
+def load_bindings(source_directory):
+    # also used by the shell runtime tester for the fake Brick Daemon
+    global IPConnection, Error, BrickletTemperature, BrickletLEDStrip, BrickMaster, base58encode, PollingScheduler, CallbackPipeline, \
+           CallbackTrace, callback_ring, TopologyCache, IPConnectionPool, enumerate_endpoints, BrickProxy, \
+           CallbackRecorder, CallbackRecordingReader
+
+    sys.path.insert(0, source_directory)
+
+    from tinkerforge.ip_connection import IPConnection, Error, base58encode, CallbackTrace
+    from tinkerforge.bricklet_temperature import BrickletTemperature
+    from tinkerforge.bricklet_led_strip import BrickletLEDStrip
+    from tinkerforge.brick_master import BrickMaster
+    from tinkerforge.polling_scheduler import PollingScheduler
+    from tinkerforge.callback_pipeline import CallbackPipeline
+    from tinkerforge import callback_ring
+    from tinkerforge.topology_cache import TopologyCache
+    from tinkerforge.ip_connection_pool import IPConnectionPool
+    from tinkerforge.ip_connection import enumerate_endpoints
+    from tinkerforge.brick_proxy import BrickProxy
+    from tinkerforge.callback_recorder import CallbackRecorder, CallbackRecordingReader
+
+def main(source_directory):
+    load_bindings(source_directory)
+
+    suite = unittest.TestSuite()
+
+    test_cases = [GetterTest, SetterTest, ResponseCacheTest, CallbackTest, PollingSchedulerTest, CallbackPipelineTest,
+                  TracingTest, CallbackRingTest, PacketTapTest, LEDStripTest, BrickletPluginTest, TopologyCacheTest,
+                  IPConnectionPoolTest, EnumerateEndpointsTest, BrickProxyTest, CallbackRecorderTest, ReconnectTest,
+                  AuthenticationTest]
+
+    for test_case in test_cases:
+        suite.addTest(unittest.TestLoader().loadTestsFromTestCase(test_case))
+
+    return unittest.TextTestRunner(verbosity=2).run(suite).wasSuccessful()
+
+def unpack_bindings(path, directory):
+    sys.path.append(os.path.split(path)[0])
+    import common
+
+    version = common.get_changelog_version(path)
+    zipname = 'tinkerforge_python_bindings_{0}_{1}_{2}.zip'.format(*version)
+
+    # Make temporary bindings directory
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+
+    os.makedirs(directory)
+
+    with common.ChangedDirectory(directory):
+        print('>>> unpacking {0}'.format(zipname))
+
+        if subprocess.call(['/usr/bin/unzip', '-q', os.path.join(path, zipname)]) != 0:
+            print('### could not unpack {0}'.format(zipname))
+            return False
+
+        print('>>> unpacking {0} done\n'.format(zipname))
+
+    return True
+
+def run(path):
+    if not unpack_bindings(path, '/tmp/tester'):
+        return False
+
+    for python in ['python', 'python3']:
+        print('>>> [{0}] testing runtime'.format(python))
+
+        args = [python, os.path.join(path, 'test_python_runtime.py'), '--source', '/tmp/tester/source']
+
+        if subprocess.call(args) != 0:
+            print('### [{0}] runtime test failed'.format(python))
+            return False
+
+        print('>>> [{0}] runtime test succeded\n'.format(python))
+
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == '--source':
+        sys.exit(not main(sys.argv[2]))
+
+    sys.exit(not run(os.getcwd()))
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2026 agent <agent@local>
+#
+# Redistribution and use in source and binary forms of this file,
+# with or without modification, are permitted. See the Creative
+# Commons Zero (CC0 1.0) License for more details.
+
+from threading import Lock, Timer
+
+import os
+import json
+
+try:
+    from .ip_connection import IPConnection, Error, namedtuple
+except (ValueError, ImportError):
+    from ip_connection import IPConnection, Error, namedtuple
+
+try:
+    from . import get_device_class
+except (ValueError, ImportError):
+    get_device_class = None
+
+TopologyEntry = namedtuple('TopologyEntry', ['uid', 'connected_uid', 'position', 'hardware_version', 'firmware_version', 'device_identifier'])
+
+class TopologyCache:
+    CALLBACK_DEVICE_ADDED = 0
+    CALLBACK_DEVICE_CHANGED = 1
+    CALLBACK_DEVICE_REMOVED = 2
+    CALLBACK_ENUMERATE = IPConnection.CALLBACK_ENUMERATE
+
+    def __init__(self, ipcon, filename, refresh_duration=0.25):
+        """
+        Creates a topology cache for the IP Connection *ipcon* that is stored
+        in the file *filename*. The cached topology is loaded right away, so
+        create_devices can be called before *ipcon* is connected.
+
+        Each time *ipcon* gets connected the cached topology is checked in the
+        background as by refresh with *refresh_duration*. If *ipcon* is
+        already connected, the check starts right away.
+
+        The cache adds listeners to the enumerate and connected callbacks of
+        *ipcon*, the callbacks registered with *ipcon* itself stay untouched.
+        They are called first, so a registered connected callback can
+        authenticate before the enumerate is sent.
+        """
+
+        self.ipcon = ipcon
+        self.filename = filename
+        self.refresh_duration = refresh_duration
+        self.entries = {} # protected by lock
+        self.seen_uids = None # protected by lock, set while refreshing
+        self.refresh_timer = None # protected by lock
+        self.lock = Lock()
+        self.registered_callbacks = {}
+
+        self.load()
+
+        self.listener_token = ipcon.add_listener(IPConnection.CALLBACK_ENUMERATE, self.handle_enumerate)
+        self.connected_listener_token = ipcon.add_listener(IPConnection.CALLBACK_CONNECTED, self.handle_connected)
+
+        if ipcon.get_connection_state() == IPConnection.CONNECTION_STATE_CONNECTED:
+            self.refresh(refresh_duration)
+
+    def register_callback(self, id, callback):
+        """
+        Registers a callback with ID *id* to the function *callback*.
+
+        CALLBACK_DEVICE_ADDED and CALLBACK_DEVICE_REMOVED get the
+        TopologyEntry of the device, CALLBACK_DEVICE_CHANGED gets the old and
+        the new TopologyEntry. CALLBACK_ENUMERATE gets the same arguments as
+        the enumerate callback of the IP Connection.
+        """
+
+        self.registered_callbacks[id] = callback
+
+    def load(self):
+        """
+        Loads the cached topology from the file and returns it as dict from
+        UID to TopologyEntry. A missing or unreadable file results in an
+        empty topology.
+        """
+
+        try:
+            f = open(self.filename, 'r')
+
+            try:
+                raw_entries = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            raw_entries = []
+
+        entries = {}
+
+        for raw_entry in raw_entries:
+            try:
+                entry = TopologyEntry(raw_entry['uid'],
+                                      raw_entry['connected_uid'],
+                                      raw_entry['position'],
+                                      tuple(raw_entry['hardware_version']),
+                                      tuple(raw_entry['firmware_version']),
+                                      raw_entry['device_identifier'])
+            except (KeyError, TypeError):
+                continue
+
+            entries[entry.uid] = entry
+
+        with self.lock:
+            self.entries = entries
+
+        return dict(entries)
+
+    def save(self):
+        """
+        Writes the current topology to the file. The file is replaced
+        atomically where the platform allows it.
+        """
+
+        with self.lock:
+            raw_entries = []
+
+            for uid in sorted(self.entries.keys()):
+                entry = self.entries[uid]
+                raw_entries.append({'uid': entry.uid,
+                                    'connected_uid': entry.connected_uid,
+                                    'position': entry.position,
+                                    'hardware_version': list(entry.hardware_version),
+                                    'firmware_version': list(entry.firmware_version),
+                                    'device_identifier': entry.device_identifier})
+
+        temporary_filename = self.filename + '.tmp'
+        f = open(temporary_filename, 'w')
+
+        try:
+            json.dump(raw_entries, f)
+        finally:
+            f.close()
+
+        try:
+            os.rename(temporary_filename, self.filename)
+        except OSError:
+            # rename cannot replace an existing file on Windows
+            os.remove(self.filename)
+            os.rename(temporary_filename, self.filename)
+
+    def get_entries(self):
+        """
+        Returns the current topology as dict from UID to TopologyEntry.
+        """
+
+        with self.lock:
+            return dict(self.entries)
+
+    def create_devices(self):
+        """
+        Creates a device object for every device in the current topology and
+        returns them as dict from UID to device object. Devices with unknown
+        device identifier are skipped. Requires the tinkerforge package.
+        """
+
+        if get_device_class is None:
+            raise RuntimeError('Creating devices requires the tinkerforge package')
+
+        devices = {}
+
+        for uid, entry in self.get_entries().items():
+            try:
+                device_class = get_device_class(entry.device_identifier)
+            except ValueError:
+                continue
+
+            devices[uid] = device_class(uid, self.ipcon)
+
+        return devices
+
+    def refresh(self, duration=0.25):
+        """
+        Starts an enumerate to check the cached topology against the actual
+        devices and returns immediately. Devices that report differently than
+        cached trigger CALLBACK_DEVICE_ADDED and CALLBACK_DEVICE_CHANGED as
+        their enumerate callbacks arrive. Cached devices that did not respond
+        within *duration* seconds trigger CALLBACK_DEVICE_REMOVED. After that
+        the file is updated.
+        """
+
+        with self.lock:
+            if self.refresh_timer is not None:
+                self.refresh_timer.cancel()
+
+            self.seen_uids = set()
+            refresh_timer = Timer(duration, self.finish_refresh)
+            refresh_timer.daemon = True
+            refresh_timer.start()
+            self.refresh_timer = refresh_timer
+
+        try:
+            self.ipcon.enumerate()
+        except:
+            # without an enumerate all cached devices would count as removed
+            with self.lock:
+                if self.refresh_timer is refresh_timer:
+                    refresh_timer.cancel()
+                    self.seen_uids = None
+                    self.refresh_timer = None
+
+            raise
+
+    def finish_refresh(self):
+        removed = []
+
+        with self.lock:
+            if self.seen_uids is None:
+                return
+
+            for uid in list(self.entries.keys()):
+                if uid not in self.seen_uids:
+                    removed.append(self.entries.pop(uid))
+
+            self.seen_uids = None
+            self.refresh_timer = None
+
+        for entry in removed:
+            self.dispatch(TopologyCache.CALLBACK_DEVICE_REMOVED, entry)
+
+        self.save()
+
+    def handle_connected(self, connect_reason):
+        # also after an auto-reconnect, devices might have changed meanwhile
+        try:
+            self.refresh(self.refresh_duration)
+        except Error:
+            pass # disconnected again, the next connect refreshes
+
+    def handle_enumerate(self, uid, connected_uid, position, hardware_version,
+                         firmware_version, device_identifier, enumeration_type):
+        entry = TopologyEntry(uid, connected_uid, position,
+                              tuple(hardware_version), tuple(firmware_version),
+                              device_identifier)
+        event = None
+
+        with self.lock:
+            old_entry = self.entries.get(uid)
+
+            if enumeration_type == IPConnection.ENUMERATION_TYPE_DISCONNECTED:
+                if old_entry is not None:
+                    del self.entries[uid]
+                    event = (TopologyCache.CALLBACK_DEVICE_REMOVED, old_entry)
+            else:
+                if self.seen_uids is not None:
+                    self.seen_uids.add(uid)
+
+                self.entries[uid] = entry
+
+                if old_entry is None:
+                    event = (TopologyCache.CALLBACK_DEVICE_ADDED, entry)
+                elif old_entry != entry:
+                    event = (TopologyCache.CALLBACK_DEVICE_CHANGED, old_entry, entry)
+
+            is_refreshing = self.seen_uids is not None
+
+        if event is not None:
+            self.dispatch(*event)
+
+            if not is_refreshing:
+                self.save()
+
+        self.dispatch(TopologyCache.CALLBACK_ENUMERATE, uid, connected_uid, position,
+                      hardware_version, firmware_version, device_identifier,
+                      enumeration_type)
+
+    def dispatch(self, id, *args):
+        callback = self.registered_callbacks.get(id)
+
+        if callback is not None:
+            callback(*args)
@@ -88,193 +88,106 @@ class {0}(Device):"""
         else:
             return '\n'
 
-    def get_shell_call_header(self):
-        header = """
-def call_{0}_{1}(ctx, argv):
-\tprog_prefix = 'call {2} <uid>'
+    def get_shell_call_table(self):
+        table = """
 
+# function -> (function id, request format, response format, parameters, response names, response symbols)
+call_{0}_{1} = ({2}, {{
+{3}
+}})
 """
-
-        return header.format(self.get_underscore_name(),
-                             self.get_category().lower(),
-                             self.get_shell_device_name())
-
-    def get_shell_call_functions(self):
-        setter = """\tdef {0}(ctx, argv):
-\t\tparser = ParserWithExpectResponse(ctx, prog_prefix + ' {1}')
-{2}
-\t\targs = parser.parse_args(argv)
-
-\t\tdevice_send_request(ctx, {7}{8}, {3}, ({4}), '{5}', '{6}', None, args.expect_response, [], [])
-"""
-        getter = """\tdef {0}(ctx, argv):
-\t\tparser = ParserWithExecute(ctx, prog_prefix + ' {1}')
-{2}
-\t\targs = parser.parse_args(argv)
-
-\t\tdevice_send_request(ctx, {7}{8}, {3}, ({4}), '{5}', '{6}', args.execute, False, [{9}], [{10}])
-"""
-        get_identity = """\tdef get_identity(ctx, argv):
-\t\tcommon_get_identity(ctx, prog_prefix, {0}, argv)
-"""
-
-        functions = []
         entries = []
 
         for packet in self.get_packets('function'):
-            if packet.get_function_id() == 255:
-                function = get_identity.format(self.get_shell_class_name())
-            else:
-                params = []
-                request_data = []
-
-                for element in packet.get_elements('in'):
-                    name = element.get_underscore_name()
-                    type_converter = element.get_shell_type_converter()
-                    help = element.get_shell_help()
-                    metavar = "'<{0}>'".format(element.get_dash_name())
-
-                    params.append("\t\tparser.add_argument('{0}', type={1}, help={2}, metavar={3})".format(name, type_converter, help, metavar))
-                    request_data.append('args.{0}'.format(name))
-
-                comma = ''
-                if len(request_data) == 1:
-                    comma = ','
-
-                if len(params) > 0:
-                    params = [''] + params + ['']
-
-                output_names = []
-                output_symbols = []
-
-                for element in packet.get_elements('out'):
-                    output_names.append("'{0}'".format(element.get_dash_name()))
-
-                    if element.get_constant_group() is not None:
-                        symbols = {}
-
-                        for constant_item in element.get_constant_group().get_items():
-                            symbols[constant_item.get_value()] = constant_item.get_dash_name()
-
-                        output_symbols.append(str(symbols))
-                    else:
-                        output_symbols.append('None')
-
-                underscore_name = packet.get_underscore_name()
-                dash_name = packet.get_dash_name()
-
-                if len(output_names) > 0:
-                    if not underscore_name.startswith('get_') and \
-                       not underscore_name.startswith('is_') and \
-                       not underscore_name.startswith('are_'):
-                        getter_patterns.append(dash_name)
-
-                    function = getter.format(underscore_name,
-                                             dash_name,
-                                             '\n'.join(params),
-                                             packet.get_function_id(),
-                                             ', '.join(request_data) + comma,
-                                             packet.get_shell_format_list('in'),
-                                             packet.get_shell_format_list('out'),
-                                             self.get_camel_case_name(),
-                                             self.get_category(),
-                                             ', '.join(output_names),
-                                             ', '.join(output_symbols))
-                else:
-                    if not underscore_name.startswith('set_'):
-                        setter_patterns.append(dash_name)
-
-                    function = setter.format(underscore_name,
-                                             dash_name,
-                                             '\n'.join(params),
-                                             packet.get_function_id(),
-                                             ', '.join(request_data) + comma,
-                                             packet.get_shell_format_list('in'),
-                                             packet.get_shell_format_list('out'),
-                                             self.get_camel_case_name(),
-                                             self.get_category())
-
-            functions.append(function)
-
-            entries.append("'{0}': {1}".format(packet.get_dash_name(),
-                                               packet.get_underscore_name()))
+            params = []
 
-        return '\n'.join(functions) + '\n\tfunctions = {\n\t' + ',\n\t'.join(entries) + '\n\t}'
+            for element in packet.get_elements('in'):
+                params.append("('{0}', {1}, {2})".format(element.get_underscore_name(),
+                                                         element.get_shell_type_converter(),
+                                                         element.get_shell_help()))
 
-    def get_shell_call_footer(self):
-        footer = """
-
-\tcall_generic(ctx, '{0}', functions, argv)
-"""
+            # converters and help texts depend on the context, they are only
+            # created for the function that is called
+            if len(params) > 0:
+                params = 'lambda ctx: [{0}]'.format(', '.join(params))
+            else:
+                params = 'None'
 
-        return footer.format(self.get_shell_device_name())
+            output_names = []
+            output_symbols = []
 
-    def get_shell_dispatch_header(self):
-        header = """
-def dispatch_{0}_{1}(ctx, argv):
-\tprog_prefix = 'dispatch {2} <uid>'
+            for element in packet.get_elements('out'):
+                output_names.append("'{0}'".format(element.get_dash_name()))
 
-"""
+                if packet.get_function_id() == 255 and element.get_underscore_name() == 'device_identifier':
+                    output_symbols.append('device_identifier_symbols')
+                elif element.get_constant_group() is not None:
+                    symbols = {}
 
-        return header.format(self.get_underscore_name(),
-                             self.get_category().lower(),
-                             self.get_shell_device_name())
+                    for constant_item in element.get_constant_group().get_items():
+                        symbols[constant_item.get_value()] = constant_item.get_dash_name()
 
-    def get_shell_dispatch_functions(self):
-        func = """\tdef {0}(ctx, argv):
-\t\tparser = ParserWithExecute(ctx, prog_prefix + ' {1}')
+                    output_symbols.append(str(symbols))
+                else:
+                    output_symbols.append('None')
 
-\t\targs = parser.parse_args(argv)
+            underscore_name = packet.get_underscore_name()
+            dash_name = packet.get_dash_name()
 
-\t\tdevice_callback(ctx, {2}{3}, {4}, args.execute, [{5}])
+            if len(output_names) > 0:
+                if not underscore_name.startswith('get_') and \
+                   not underscore_name.startswith('is_') and \
+                   not underscore_name.startswith('are_'):
+                    getter_patterns.append(dash_name)
+            else:
+                if not underscore_name.startswith('set_'):
+                    setter_patterns.append(dash_name)
+
+            entries.append("'{0}': ({1}, '{2}', '{3}', {4}, [{5}], [{6}])".format(dash_name,
+                                                                                packet.get_function_id(),
+                                                                                packet.get_shell_format_list('in'),
+                                                                                packet.get_shell_format_list('out'),
+                                                                                params,
+                                                                                ', '.join(output_names),
+                                                                                ', '.join(output_symbols)))
+
+        return table.format(self.get_underscore_name(),
+                            self.get_category().lower(),
+                            self.get_shell_class_name(),
+                            ',\n'.join(entries))
+
+    def get_shell_dispatch_table(self):
+        table = """
+# callback -> (function id, names)
+dispatch_{0}_{1} = ({2}, {{
+{3}
+}})
 """
-
-        functions = []
         entries = []
 
         for packet in self.get_packets('callback'):
-            output = []
+            output_names = []
 
             for element in packet.get_elements('out'):
-                output.append("'{0}'".format(element.get_dash_name()))
-
-            underscore_name = packet.get_underscore_name()
-            dash_name = packet.get_dash_name()
+                output_names.append("'{0}'".format(element.get_dash_name()))
 
-            function = func.format(underscore_name,
-                                   dash_name,
-                                   self.get_camel_case_name(),
-                                   self.get_category(),
-                                   packet.get_function_id(),
-                                   ', '.join(output))
+            entries.append("'{0}': ({1}, [{2}])".format(packet.get_dash_name(),
+                                                        packet.get_function_id(),
+                                                        ', '.join(output_names)))
 
-            entries.append("'{0}': {1}".format(dash_name,
-                                               underscore_name))
+            callback_patterns.append(packet.get_dash_name())
 
-            callback_patterns.append(dash_name)
-
-            functions.append(function)
-
-        return '\n'.join(functions) + '\n\tcallbacks = {\n\t' + ',\n\t'.join(entries) + '\n\t}'
-
-    def get_shell_dispatch_footer(self):
-        footer = """
-
-\tdispatch_generic(ctx, '{0}', callbacks, argv)
-"""
-
-        return footer.format(self.get_shell_device_name())
+        return table.format(self.get_underscore_name(),
+                            self.get_category().lower(),
+                            self.get_shell_class_name(),
+                            ',\n'.join(entries))
 
     def get_shell_source(self):
         source  = self.get_shell_class()
         source += self.get_shell_init_method()
         source += self.get_shell_callback_formats()
-        source += self.get_shell_call_header()
-        source += self.get_shell_call_functions()
-        source += self.get_shell_call_footer()
-        source += self.get_shell_dispatch_header()
-        source += self.get_shell_dispatch_functions()
-        source += self.get_shell_dispatch_footer()
+        source += self.get_shell_call_table()
+        source += self.get_shell_dispatch_table()
 
         return source
 
@@ -304,13 +217,13 @@ class ShellBindingsGenerator(common.BindingsGenerator):
         if not device.is_released():
             return
 
-        self.call_devices.append("'{0}': call_{1}_{2}".format(device.get_shell_device_name(),
-                                                              device.get_underscore_name(),
-                                                              device.get_category().lower()))
+        self.call_devices.append("'{0}': 'call_{1}_{2}'".format(device.get_shell_device_name(),
+                                                                device.get_underscore_name(),
+                                                                device.get_category().lower()))
 
-        self.dispatch_devices.append("'{0}': dispatch_{1}_{2}".format(device.get_shell_device_name(),
-                                                                      device.get_underscore_name(),
-                                                                      device.get_category().lower()))
+        self.dispatch_devices.append("'{0}': 'dispatch_{1}_{2}'".format(device.get_shell_device_name(),
+                                                                        device.get_underscore_name(),
+                                                                        device.get_category().lower()))
 
         self.device_identifier_symbols.append("{0}: '{1}'".format(device.get_device_identifier(),
                                                                   device.get_shell_device_name()))
@@ -339,8 +252,16 @@ class ShellBindingsGenerator(common.BindingsGenerator):
         ipcon = file(os.path.join(directory, '..', 'python', 'ip_connection.py'), 'rb').read()
         shell.write('\n\n\n' + ipcon + '\n\n\n')
 
+        # device sections are stored as strings and only compiled by
+        # load_device_table when they are used. this keeps the startup
+        # time independent of the number of devices
+        device_sources = []
+
         for filename in sorted(self.part_files):
-            shell.write(file(os.path.join(directory, 'bindings', filename), 'rb').read())
+            source = file(os.path.join(directory, 'bindings', filename), 'rb').read()
+            device_sources.append("'{0}': {1}".format(filename.replace('.part', ''), repr(source)))
+
+        shell.write('\ndevice_sources = {\n' + ',\n'.join(device_sources) + '\n}\n')
 
         shell.write('\ncall_devices = {\n' + ',\n'.join(self.call_devices) + '\n}\n')
         shell.write('\ndispatch_devices = {\n' + ',\n'.join(self.dispatch_devices) + '\n}\n')
@@ -29,6 +29,7 @@ import shutil
 
 sys.path.append(os.path.split(os.getcwd())[0])
 import common
+import test_shell_runtime
 
 class ShellExamplesTester(common.ExamplesTester):
     def __init__(self, path, extra_examples):
@@ -38,7 +39,12 @@ class ShellExamplesTester(common.ExamplesTester):
         return os.system('TINKERFORGE_SHELL_BINDINGS_DRY_RUN=1 PATH=/tmp/tester:${PATH} ' + src) == 0
 
 def run(path):
-    return ShellExamplesTester(path, []).run()
+    success = ShellExamplesTester(path, []).run()
+
+    if not success:
+        return success
+
+    return test_shell_runtime.run(path)
 
 if __name__ == "__main__":
     sys.exit(run(os.getcwd()))
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Shell Runtime Tester
+Copyright (C) 2026 agent <agent@local>
+
+test_shell_runtime.py: Tests the Shell bindings against a fake Brick Daemon
+
+This program is free software; you can redistribute it and/or
+modify it under the terms of the GNU General Public License
+as published by the Free Software Foundation; either version 2
+of the License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+General Public License for more details.
+
+You should have received a copy of the GNU General Public
+License along with this program; if not, write to the
+Free Software Foundation, Inc., 59 Temple Place - Suite 330,
+Boston, MA 02111-1307, USA.
+"""
+
+import sys
+import os
+import subprocess
+import socket
+import time
+import re
+import tempfile
+import unittest
+
+# the fake Brick Daemon of the Python runtime tester, it needs the Python
+# bindings for the function IDs of the fake devices
+sys.path.append(os.path.join(os.path.split(os.path.abspath(__file__))[0], '..', 'python'))
+import test_python_runtime
+from test_python_runtime import FakeBrickDaemon, FIRST_DEVICE_UID
+
+# set by main()
+SCRIPT = None
+
+DEVICE_COUNT = 2
+CALLBACK_PERIOD = 10 # ms
+DISPATCH_DURATION = 300 # ms
+WAIT_TIMEOUT = 5.0 # seconds
+
+def parse_records(output):
+    # one key=value per line. records with several keys are separated by an
+    # empty line, single key records are not
+    records = []
+    record = {}
+
+    for line in output.split('\n'):
+        if len(line) == 0:
+            if len(record) > 0:
+                records.append(record)
+                record = {}
+
+            continue
+
+        key, value = line.split('=', 1)
+
+        if key in record:
+            records.append(record)
+            record = {}
+
+        record[key] = value
+
+    if len(record) > 0:
+        records.append(record)
+
+    return records
+
+class ShellRuntimeTest(unittest.TestCase):
+    def setUp(self):
+        self.brickd = FakeBrickDaemon()
+        self.uids = []
+
+        for i in range(DEVICE_COUNT):
+            self.brickd.add_device(FIRST_DEVICE_UID + i)
+            self.uids.append(test_python_runtime.base58encode(FIRST_DEVICE_UID + i))
+
+    def tearDown(self):
+        self.brickd.close()
+
+    def get_command(self, args):
+        return [sys.executable, SCRIPT, '--port', str(self.brickd.port)] + args
+
+    def run_command(self, args):
+        process = subprocess.Popen(self.get_command(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+
+        self.assertEqual(process.returncode, 0, stderr.decode('utf-8'))
+
+        return stdout.decode('utf-8')
+
+    def start_callbacks(self, uid):
+        # brickd sends the callbacks to all clients, also to the ones started later
+        self.run_command(['call', 'temperature-bricklet', uid, 'set-temperature-callback-period', str(CALLBACK_PERIOD)])
+
+class CallTest(ShellRuntimeTest):
+    def test_call_getter(self):
+        self.assertEqual(self.run_command(['call', 'temperature-bricklet', self.uids[0], 'get-temperature']),
+                         'temperature={0}\n'.format(FIRST_DEVICE_UID % 10000))
+
+class DispatchTest(ShellRuntimeTest):
+    def test_dispatch(self):
+        self.start_callbacks(self.uids[0])
+
+        records = parse_records(self.run_command(['dispatch', '--duration', str(DISPATCH_DURATION),
+                                                  'temperature-bricklet', self.uids[0], 'temperature']))
+
+        self.assertGreater(len(records), 1)
+
+        # the fake sends a counter as temperature
+        values = [int(record['temperature']) for record in records]
+
+        self.assertEqual(values, list(range(values[0], values[0] + len(values))))
+
+    def check_targets(self, output):
+        records = parse_records(output)
+        uids = [record['uid'] for record in records]
+
+        for record in records:
+            self.assertEqual((record['device'], record['callback']), ('temperature-bricklet', 'temperature'))
+
+        # both targets are dispatched at the same time over one connection,
+        # so their records are interleaved instead of one after the other
+        self.assertEqual(set(uids), set(self.uids))
+        self.assertEqual(set(uids[:len(uids) // 2]), set(self.uids))
+
+    def test_dispatch_targets(self):
+        for uid in self.uids:
+            self.start_callbacks(uid)
+
+        args = ['dispatch', '--duration', str(DISPATCH_DURATION)]
+
+        for uid in self.uids:
+            args += ['--target', 'temperature-bricklet', uid, 'temperature']
+
+        self.check_targets(self.run_command(args))
+
+    def test_dispatch_subscriptions(self):
+        for uid in self.uids:
+            self.start_callbacks(uid)
+
+        handle, filename = tempfile.mkstemp(suffix='.txt')
+
+        try:
+            with os.fdopen(handle, 'w') as f:
+                f.write('# device uid callback\n')
+
+                for uid in self.uids:
+                    f.write('temperature-bricklet {0} temperature\n'.format(uid))
+
+            self.check_targets(self.run_command(['dispatch', '--duration', str(DISPATCH_DURATION),
+                                                 '--subscriptions', filename]))
+        finally:
+            os.remove(filename)
+
+class ListenTest(ShellRuntimeTest):
+    def setUp(self):
+        ShellRuntimeTest.setUp(self)
+
+        # a free port, another process could take it before listen binds it
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+
+        # listen logs every command and response to stdout
+        self.devnull = open(os.devnull, 'w')
+        self.listen = subprocess.Popen(self.get_command(['listen', '--address', '127.0.0.1', '--port', str(port)]),
+                                       stdout=self.devnull, stderr=self.devnull)
+        self.socket = None
+        self.pending = ''
+        deadline = time.time() + WAIT_TIMEOUT
+
+        while self.socket is None:
+            try:
+                self.socket = socket.create_connection(('127.0.0.1', port))
+            except socket.error:
+                if time.time() > deadline:
+                    raise
+
+                time.sleep(0.05)
+
+    def tearDown(self):
+        self.socket.close()
+        self.listen.kill()
+        self.listen.wait()
+        self.devnull.close()
+
+        ShellRuntimeTest.tearDown(self)
+
+    def send(self, command):
+        self.socket.sendall((command + '\n').encode('utf-8'))
+
+    def receive_line(self):
+        deadline = time.time() + WAIT_TIMEOUT
+
+        while '\n' not in self.pending:
+            self.socket.settimeout(max(deadline - time.time(), 0.01))
+
+            try:
+                data = self.socket.recv(4096)
+            except socket.timeout:
+                self.fail('No output from listen in time')
+
+            self.assertGreater(len(data), 0, 'Listen closed the connection')
+
+            self.pending += data.decode('utf-8')
+
+        line, self.pending = self.pending.split('\n', 1)
+
+        return line
+
+    def receive_request(self, request_id):
+        # lines of other requests are skipped
+        while True:
+            line = self.receive_line()
+
+            if line.startswith('@{0} '.format(request_id)):
+                return line[len(request_id) + 2:]
+
+    def test_request_ids(self):
+        for i, uid in enumerate(self.uids):
+            self.send('@r{0} call temperature-bricklet {1} get-temperature'.format(i, uid))
+
+        # the requests run concurrently, their lines can arrive in any order
+        lines = [self.receive_line() for i in range(2 * len(self.uids))]
+
+        for i, uid in enumerate(self.uids):
+            self.assertEqual([line for line in lines if line.startswith('@r{0} '.format(i))],
+                             ['@r{0} temperature={1}'.format(i, (FIRST_DEVICE_UID + i) % 10000),
+                              '@r{0} done'.format(i)])
+
+    def test_cancel_dispatch(self):
+        self.start_callbacks(self.uids[0])
+        self.send('@d dispatch temperature-bricklet {0} temperature'.format(self.uids[0]))
+
+        # runs until it is canceled
+        for i in range(3):
+            self.assertTrue(self.receive_request('d').startswith('temperature='))
+
+        self.send('@d cancel')
+
+        while True:
+            line = self.receive_request('d')
+
+            if line == 'done':
+                break
+
+            self.assertTrue(line.startswith('temperature='))
+
+        self.send('@d cancel')
+        self.assertTrue(self.receive_request('d').startswith('error'))
+
+    def test_too_many_requests(self):
+        with open(SCRIPT, 'r') as f:
+            limit = int(re.search(r'^LISTEN_MAX_REQUESTS_PER_CLIENT = (\d+)$', f.read(), re.MULTILINE).group(1))
+
+        # dispatches without callbacks run until they are canceled
+        for i in range(limit + 1):
+            self.send('@d{0} dispatch temperature-bricklet {1} temperature'.format(i, self.uids[0]))
+
+        self.assertTrue(self.receive_request('d{0}'.format(limit)).startswith('error'))
+
+        # a canceled request makes room for another one
+        self.send('@d0 cancel')
+        self.assertEqual(self.receive_request('d0'), 'done')
+
+        self.send('@x call temperature-bricklet {0} get-temperature'.format(self.uids[0]))
+        self.assertEqual(self.receive_request('x'), 'temperature={0}'.format(FIRST_DEVICE_UID % 10000))
+
+def main(script, python_source_directory):
+    global SCRIPT
+
+    SCRIPT = script
+
+    test_python_runtime.load_bindings(python_source_directory)
+
+    suite = unittest.TestSuite()
+
+    for test_case in [CallTest, DispatchTest, ListenTest]:
+        suite.addTest(unittest.TestLoader().loadTestsFromTestCase(test_case))
+
+    return unittest.TextTestRunner(verbosity=2).run(suite).wasSuccessful()
+
+def run(path):
+    # the shell examples tester left the unpacked script in /tmp/tester
+    python_path = os.path.join(os.path.split(path)[0], 'python')
+
+    if not test_python_runtime.unpack_bindings(python_path, '/tmp/tester-python'):
+        return False
+
+    for python in ['python', 'python3']:
+        print('>>> [{0}] testing runtime'.format(python))
+
+        args = [python, os.path.join(path, 'test_shell_runtime.py'), '--script', '/tmp/tester/tinkerforge',
+                '--python-source', '/tmp/tester-python/source']
+
+        if subprocess.call(args) != 0:
+            print('### [{0}] runtime test failed'.format(python))
+            return False
+
+        print('>>> [{0}] runtime test succeded\n'.format(python))
+
+    return True
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == '--script' and sys.argv[3] == '--python-source':
+        sys.exit(not main(sys.argv[2], sys.argv[4]))
+
+    sys.exit(not run(os.getcwd()))